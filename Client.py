@@ -3,6 +3,9 @@ import random
 import pickle
 import time
 import GameData
+import framing
+import transport
+import utils
 from sys import stdout
 from constants import *
 from copy import deepcopy
@@ -20,11 +23,30 @@ PLAY_COMMAND = "play"
 
 class Client:
 
-    def __init__(self, player_name, ip, port):
+    def __init__(self, player_name, ip, port, codec=PICKLE_CODEC, subscribe=False, table=None):
         self.player_name = player_name
+        # With no port, ip is the address of the server with its transport (see transport.py)
         self.ip = ip
         self.port = port
+        # Table to join on the server, None lets the server choose one. Set to the actual one on connection
+        self.table = table
+        # Codec of the messages we send, the server answers with the same one
+        self.codec = codec
+        # Let the server push state deltas instead of asking for the state with "show"
+        self.subscribe = subscribe
+        # Deck seed asked to the server for the next game, None for a random deck
+        self.seed = None
+        # Random choices of our moves, seeded at every game start (see startRandom)
+        self.rng = random.Random()
         self.ready = False
+        self.sent_ready_command = False
+        self.running = True
+        # Reassembles the server messages, set on connection
+        self.reader = None
+        self.resetGameState()
+
+    def resetGameState(self):
+        """forgets everything about the current game, before joining the next one"""
         self.all_ready = False
         self.current_status = CLIENT_STATUSES[0]
         self.game_data = {
@@ -34,8 +56,6 @@ class Client:
             "players": [],
             "player_names": []
         }
-        self.sent_ready_command = False
-        self.running = True
 
         # To store information received in hints
         self.knowledge = []
@@ -45,20 +65,116 @@ class Client:
                 "value": None,
                 "last_update": time.time()
             })
+        # The cards every hand slot may hold as a 25 bits mask (see utils.FULL_BELIEF), narrowed by every hint:
+        # color and value in knowledge are the ones the belief leaves, if only one
+        self.beliefs = [utils.FULL_BELIEF] * 5
+
+        # Cards we have not seen yet (ours or still in the deck), one counter per (color, value)
+        self.resetUnseenCards()
+
+    def startRandom(self):
+        """
+        seeds our random choices from the deck seed and our seat in the turn order: a seeded game makes the same moves
+        in every process and in headless.py, whatever the other players drew or the order they joined in
+        (names do not change the deal). Unseeded games stay random
+        """
+        seat = self.game_data["player_names"].index(self.player_name)
+        self.rng = random.Random(None if self.seed is None else f"{self.seed}/{seat}")
+
+    def resetUnseenCards(self):
+        """starts counting the unseen cards from the whole deck"""
+        self.unseen_cards = utils.generateCardCounts()
+        self.counted_table_cards = {color: 0 for color in utils.COLORS}
+        self.counted_discarded_cards = 0
+        self.counted_hand_cards = []
+
+    def updateUnseenCards(self):
+        """removes from the unseen cards the ones that became visible since the last game state"""
+        # Table and discard pile only grow: count just the new cards
+        table_cards = self.game_data["tableCards"]
+        for color in table_cards:
+            stack = table_cards[color]
+            for i in range(self.counted_table_cards[color], len(stack)):
+                self.unseen_cards[utils.cardIndex(stack[i].color,
+                                                  stack[i].value)] -= 1
+            self.counted_table_cards[color] = len(stack)
+
+        discard_pile = self.game_data["discardPile"]
+        for i in range(self.counted_discarded_cards, len(discard_pile)):
+            self.unseen_cards[utils.cardIndex(discard_pile[i].color,
+                                              discard_pile[i].value)] -= 1
+        self.counted_discarded_cards = len(discard_pile)
+
+        # Other players' hands change every turn: give back the old cards and count the current ones
+        for index in self.counted_hand_cards:
+            self.unseen_cards[index] += 1
+        self.counted_hand_cards.clear()
+        for player in self.game_data["players"]:
+            if player.name == self.player_name:
+                continue
+            for card in player.hand:
+                index = utils.cardIndex(card.color, card.value)
+                self.unseen_cards[index] -= 1
+                self.counted_hand_cards.append(index)
+
+    def noteHint(self, hint_type, value, positions):
+        """narrows the beliefs of our slots with a hint: the hinted cards match it, all the others do not"""
+        bits = utils.hintBits(hint_type, value)
+        # Slots past our hand hold no card: a hint says nothing about them, they stay unknown
+        hand_size = self.game_data.get("handSize", len(self.beliefs))
+        for i in range(hand_size):
+            if i in positions:
+                self.beliefs[i] &= bits
+            else:
+                self.beliefs[i] &= ~bits
+            self.knowledge[i]["color"] = utils.beliefColor(self.beliefs[i])
+            self.knowledge[i]["value"] = utils.beliefValue(self.beliefs[i])
+
+    def dropSlot(self, index):
+        """
+        one of our cards left the hand: the following slots shift down as the server hand does,
+        and the slot after the last card (the drawn one, if any) starts unknown
+        """
+        # Our hand size before the move: the state is always updated before we move
+        hand_size = self.game_data.get("handSize", len(self.knowledge))
+        self.knowledge.pop(index)
+        self.beliefs.pop(index)
+        self.knowledge.insert(hand_size - 1, {
+            "color": None,
+            "value": None,
+            "last_update": time.time()
+        })
+        self.beliefs.insert(hand_size - 1, utils.FULL_BELIEF)
+
+    def getServerAddress(self):
+        """the address of the server for transport.connect"""
+        if self.port is None:
+            return self.ip
+        return (self.ip, self.port)
+
+    def openSocket(self):
+        """returns a socket connected to the server"""
+        return transport.connect(self.getServerAddress())
 
     def connectToServer(self, _socket):
-        """starts connection with the server"""
+        """joins the server through a socket returned by openSocket"""
 
-        request = GameData.ClientPlayerAddData(self.player_name)
-        _socket.connect((self.ip, self.port))
-        _socket.send(request.serialize())
+        request = GameData.ClientPlayerAddData(self.player_name, self.table)
+        self.reader = framing.FrameReader(_socket)
+        framing.sendData(_socket, request, self.codec)
 
-        data = GameData.GameData.deserialize(_socket.recv(DATASIZE))
+        data = self.reader.read()
         if type(data) is GameData.ServerPlayerConnectionOk:
             # print("Connection accepted by the server. Welcome " + self.player_name)
-            _socket.send(
-                GameData.ClientPlayerStartRequest(
-                    self.player_name).serialize())
+            self.table = getattr(data, "table", None)
+            if self.subscribe:
+                framing.sendData(
+                    _socket,
+                    GameData.ClientStateSubscriptionRequest(self.player_name),
+                    self.codec)
+            framing.sendData(
+                _socket, GameData.ClientPlayerStartRequest(self.player_name, self.seed),
+                self.codec)
 
     def receiveDataFromServer(self, data, _socket):
         """receives and processes incoming data from game server"""
@@ -67,17 +183,26 @@ class Client:
 
         if type(data) is GameData.ServerPlayerStartRequestAccepted:
             data_ok = True
-            data = _socket.recv(DATASIZE)
-            data = GameData.GameData.deserialize(data)
+            if _socket is not None:
+                data = self.reader.read()
 
         if type(data) is GameData.ServerStartGameData:
             data_ok = True
-            _socket.send(
-                GameData.ClientPlayerReadyData(self.player_name).serialize())
+            if _socket is not None:
+                framing.sendData(
+                    _socket, GameData.ClientPlayerReadyData(self.player_name),
+                    self.codec)
             self.current_status = CLIENT_STATUSES[1]
             self.all_ready = True
             self.game_data["player"] = data.players[0]
             self.game_data["player_names"] = data.players
+            self.startRandom()
+            # The table as the game starts, until the first state: without a subscription a game
+            # can end before our first turn, and its score is still read from our table
+            self.game_data["tableCards"] = {color: [] for color in utils.COLORS}
+            self.game_data["discardPile"] = []
+            # As game.Game deals
+            self.game_data["handSize"] = 5 if len(data.players) < 4 else 4
 
         if type(data) is GameData.ServerGameStateData:
             data_ok = True
@@ -87,6 +212,10 @@ class Client:
             self.game_data["currentPlayer"] = data.currentPlayer
             self.game_data["players"] = data.players
             self.game_data["discardPile"] = data.discardPile
+            self.updateUnseenCards()
+        if type(data) is GameData.ServerGameStateDelta:
+            data_ok = True
+            self.applyStateDelta(data)
         if type(data) is GameData.ServerActionInvalid:
             data_ok = True
             invalid_action = True
@@ -101,6 +230,11 @@ class Client:
             self.game_data["usedStormTokens"] += 1
         if type(data) is GameData.ServerHintData:
             data_ok = True
+        if type(data) in (GameData.ServerActionValid, GameData.ServerPlayerMoveOk,
+                          GameData.ServerPlayerThunderStrike) and data.lastPlayer == self.player_name:
+            self.dropSlot(data.cardHandIndex)
+            # Our hand size after the move, before the next state: hints coming meanwhile stop at it
+            self.game_data["handSize"] = data.handLength
         if type(data) is GameData.ServerInvalidDataReceived:
             data_ok = True
             invalid_action = True
@@ -109,8 +243,7 @@ class Client:
             data_ok = True
             # print(f"Stopping {self.player_name}")
             stdout.flush()
-            self.dumpResults()
-            self.running = False
+            self.gameOver(_socket)
         if not data_ok:
             print("Unknown or unimplemented data type: " + str(type(data)))
             invalid_action = True
@@ -119,18 +252,49 @@ class Client:
 
         return invalid_action
 
+    def gameOver(self, _socket):
+        """saves the final state and stops the client"""
+        self.dumpResults()
+        self.running = False
+
+    def applyStateDelta(self, delta):
+        """updates the local mirror of the game state with the changes pushed by the server"""
+        # Tokens, current player and our hand size are copied as they are by processData
+        for player in self.game_data["players"]:
+            if player.name == self.player_name or player.name not in delta.handChanges:
+                continue
+            index, drawn_card = delta.handChanges[player.name]
+            player.hand.pop(index)
+            if drawn_card is not None:
+                player.hand.append(drawn_card)
+        for card in delta.playedCards:
+            self.game_data["tableCards"][card.color].append(card)
+        self.game_data["discardPile"].extend(delta.discardedCards)
+        self.updateUnseenCards()
+
     def listen(self, _socket):
         """listens for server responses"""
-        data = _socket.recv(DATASIZE)
-        if not data:
+        data = self.reader.read()
+        if data is None:
             return None
-        data = GameData.GameData.deserialize(data)
+        return self.processData(data, _socket)
+
+    def processData(self, data, _socket=None):
+        """updates the local game data with an already deserialized server message"""
         for field in vars(data).keys():
             self.game_data[field] = getattr(data, field, None)
 
         invalid_action = self.receiveDataFromServer(data, _socket)
         return data, invalid_action
 
+    def __getstate__(self):
+        # The reader holds the socket, which cannot be pickled with the results
+        state = self.__dict__.copy()
+        state["reader"] = None
+        if transport.parseAddress(self.getServerAddress())[0] == transport.SOCKETPAIR:
+            state["ip"] = None
+        return state
+
     def dumpResults(self):
         """outputs player data to a binary file"""
         try:
@@ -149,7 +313,8 @@ class Client:
         """queries hand of given players to get colors"""
         for player in self.game_data["players"]:
             if player.name == player_name:
-                return list(set(map(lambda c: c.color, player.hand)))
+                # dict keeps the hand order, a set of strings would change order between processes
+                return list(dict.fromkeys(map(lambda c: c.color, player.hand)))
 
         return []
 
@@ -157,7 +322,7 @@ class Client:
         """queries hand of given players to get values"""
         for player in self.game_data["players"]:
             if player.name == player_name:
-                return list(set(map(lambda c: c.value, player.hand)))
+                return list(dict.fromkeys(map(lambda c: c.value, player.hand)))
 
         return []
 
@@ -172,18 +337,23 @@ class Client:
         if move == "exit":
             self.run = False
             os._exit(0)
-        elif move == "show" and self.current_status == CLIENT_STATUSES[1]:
-            _socket.send(
-                GameData.ClientGetGameStateRequest(
-                    self.player_name).serialize())
+
+        request = self.buildRequest(move)
+        if request is not None:
+            framing.sendData(_socket, request, self.codec)
+        stdout.flush()
+
+    def buildRequest(self, move):
+        """translates a move string into the request to send to the server"""
+        if move == "show" and self.current_status == CLIENT_STATUSES[1]:
+            return GameData.ClientGetGameStateRequest(self.player_name)
         elif move.split(" ")[
                 0] == "discard" and self.current_status == CLIENT_STATUSES[1]:
             try:
                 cardStr = move.split(" ")
                 cardOrder = int(cardStr[1])
-                _socket.send(
-                    GameData.ClientPlayerDiscardCardRequest(
-                        self.player_name, cardOrder).serialize())
+                return GameData.ClientPlayerDiscardCardRequest(
+                    self.player_name, cardOrder)
             except:
                 pass
         elif move.split(" ")[
@@ -191,9 +361,8 @@ class Client:
             try:
                 cardStr = move.split(" ")
                 cardOrder = int(cardStr[1])
-                _socket.send(
-                    GameData.ClientPlayerPlayCardRequest(
-                        self.player_name, cardOrder).serialize())
+                return GameData.ClientPlayerPlayCardRequest(
+                    self.player_name, cardOrder)
             except:
                 pass
         elif move.split(" ")[
@@ -204,14 +373,13 @@ class Client:
                 value = move.split(" ")[3].lower()
                 if t == "value":
                     value = int(value)
-                _socket.send(
-                    GameData.ClientHintData(self.player_name, destination, t,
-                                            value).serialize())
+                return GameData.ClientHintData(self.player_name, destination,
+                                               t, value)
             except:
                 pass
         else:
             print("Unknown move: " + move)
-        stdout.flush()
+        return None
 
     def generatePlayMove(self, index=None, random_move=False):
         """generates a PLAY move with given parameters"""
@@ -220,18 +388,14 @@ class Client:
             max_rand = 3
 
         if random_move:
-            index = random.randint(0, max_rand)
+            # Only pick cards we have: the hand shrinks once the deck is empty
+            hand_size = self.game_data.get("handSize", max_rand + 1)
+            index = self.rng.randint(0, max(0, min(max_rand, hand_size - 1)))
 
         if index not in range(max_rand + 1):
             print("Invalid card index!")
             return None
 
-        self.knowledge[index] = {
-            "color": None,
-            "value": None,
-            "last_update": time.time()
-        }
-
         # print(f"-----play {index}-----")
         return f"play {index}"
 
@@ -245,18 +409,14 @@ class Client:
             return "show"
 
         if random_move:
-            index = random.randint(0, max_rand)
+            # Only pick cards we have: the hand shrinks once the deck is empty
+            hand_size = self.game_data.get("handSize", max_rand + 1)
+            index = self.rng.randint(0, max(0, min(max_rand, hand_size - 1)))
 
         if index not in range(max_rand + 1):
             print("Invalid card index!")
             return None
 
-        self.knowledge[index] = {
-            "color": None,
-            "value": None,
-            "last_update": time.time()
-        }
-
         # print(f"-----discard {index}-----")
         return f"discard {index}"
 
@@ -274,15 +434,15 @@ class Client:
                 players = list(
                     filter(lambda n: n != self.player_name,
                            self.game_data["player_names"]))
-                dest = random.choice(players)
-                hint_type = random.choice(["color", "value"])
+                dest = self.rng.choice(players)
+                hint_type = self.rng.choice(["color", "value"])
 
                 if hint_type == "color":
                     colors = self.getColorsFromPlayerHand(dest)
-                    payload = random.choice(colors)
+                    payload = self.rng.choice(colors)
                 else:
                     values = self.getValuesFromPlayerHand(dest)
-                    payload = random.choice(values)
+                    payload = self.rng.choice(values)
 
                 # print(f"-------hint {hint_type} {dest} {payload}------")
                 return f"hint {hint_type} {dest} {payload}"
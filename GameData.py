@@ -1,7 +1,7 @@
 # Data to be passed from client to server
 import pickle
 
-from constants import DATASIZE
+from constants import HEADER_SIZE
 
 # Generic object
 class GameData(object):
@@ -10,22 +10,15 @@ class GameData(object):
         self.sender = sender
 
     def serialize(self) -> bytes:
+        # A frame is the length of the pickled message followed by the message, see framing.FrameReader
         data = pickle.dumps(self)
-        datalen = len(data)
-        binaryDataLen: bytes  = datalen.to_bytes(2, 'little')
-        totdata = bytearray(binaryDataLen) + data
-        #ensure no multiple data on same request
-        for _ in range(datalen + len(binaryDataLen), DATASIZE):
-            totdata.append(0)
-        data = bytes(totdata)
-        assert(len(data) == DATASIZE)
-        return data
+        return len(data).to_bytes(HEADER_SIZE, 'little') + data
 
     def deserialize(serialized: bytes):
-        binarySize = serialized[0:2]
-        assert(len(binarySize) == 2)
+        binarySize = serialized[0:HEADER_SIZE]
+        assert(len(binarySize) == HEADER_SIZE)
         datasize = int.from_bytes(binarySize, 'little')
-        data = serialized[2:datasize + 2]
+        data = serialized[HEADER_SIZE:datasize + HEADER_SIZE]
         return pickle.loads(data)
 
 
@@ -55,17 +48,23 @@ class ClientPlayerAddData(ClientToServerData):
     '''
     A connection request from client to server.
     The client requests the server to be added to the lobby.
+    table: the name of the table to join, created if needed. None joins a table still waiting for players.
+    seed: the deck seed of the table, if this request creates it. None uses the server one.
     '''
-    def __init__(self, sender) -> None:
+    def __init__(self, sender, table=None, seed=None) -> None:
         action = "Connection request"
+        self.table = table
+        self.seed = seed
         super().__init__(sender, action)
 
 class ClientPlayerStartRequest(ClientToServerData):
     '''
     The client says it's ready to play.
+    seed: the deck seed of the next game at the table, None keeps the table one (or a random deck).
     '''
-    def __init__(self, sender) -> None:
+    def __init__(self, sender, seed=None) -> None:
         action = "Player start request"
+        self.seed = seed
         super().__init__(sender, action)
 
 class ClientPlayerReadyData(ClientToServerData):
@@ -86,6 +85,32 @@ class ClientGetGameStateRequest(ClientToServerData):
         action = "Show cards request"
         super().__init__(sender, action)
 
+class ClientStateSubscriptionRequest(ClientToServerData):
+    '''
+    Asks the server to push a ServerGameStateDelta after every move,
+    with a ServerGameStateData when the game starts, so "show" is never needed.
+    Send it after the connection is accepted, before the start request.
+    '''
+    def __init__(self, sender) -> None:
+        action = "State subscription request"
+        super().__init__(sender, action)
+
+class ClientBotSeatRequest(ClientToServerData):
+    '''
+    Asks the server to seat a bot at the table of the sender: a SmartClient playing the rules
+    in rulesOrder inside the server process, seeing only what its player may see (see server.py).
+    name: the player name of the bot.
+    table, seed: as in ClientPlayerAddData, only used if the sender did not join a table:
+    it then watches the table, receiving its messages without playing.
+    '''
+    def __init__(self, sender, name, rulesOrder, table=None, seed=None) -> None:
+        action = "Bot seat request"
+        self.name = name
+        self.rulesOrder = rulesOrder
+        self.table = table
+        self.seed = seed
+        super().__init__(sender, action)
+
 class ClientPlayerDiscardCardRequest(ClientToServerData):
     '''
     Used to discard a card.
@@ -141,10 +166,12 @@ class ServerPlayerConnectionOk(ServerToClientData):
     '''
     Server successfully received the connection request from the player.
     You need to tell the server that you are ready.
+    table: the name of the table you sit at.
     '''
-    def __init__(self, playerName) -> None:
+    def __init__(self, playerName, table=None) -> None:
         action = "Connection ok"
         self.message = "Player " + str(playerName) + " connected succesfully!"
+        self.table = table
         super().__init__(action)
 
 class ServerPlayerStartRequestAccepted(ServerToClientData):
@@ -193,6 +220,29 @@ class ServerGameStateData(ServerToClientData):
         self.discardPile = discard
         super().__init__(action)
 
+class ServerGameStateDelta(ServerToClientData):
+    '''
+    What changed in the game state with the last move, as seen by one player.
+    Only sent to players who sent a ClientStateSubscriptionRequest, right after the move broadcast.
+    currentPlayer: the name of the player that should play right now.
+    handSize: the number of cards in the hand of the receiving player.
+    handChanges: player name -> (index of the card that left the hand, card drawn or None).
+        The receiving player never sees the card it draws.
+    playedCards: cards added to the table.
+    discardedCards: cards added to the discard pile.
+    usedNoteTokens, usedStormTokens: the tokens after the move.
+    '''
+    def __init__(self, currentPlayer: str, handSize: int, handChanges: dict, playedCards: list, discardedCards: list, usedNoteTokens: int, usedStormTokens: int) -> None:
+        action = "Game state delta"
+        self.currentPlayer = currentPlayer
+        self.handSize = handSize
+        self.handChanges = handChanges
+        self.playedCards = playedCards
+        self.discardedCards = discardedCards
+        self.usedNoteTokens = usedNoteTokens
+        self.usedStormTokens = usedStormTokens
+        super().__init__(action)
+
 class ServerActionValid(ServerToClientData):
     '''
     Action well performed.
@@ -1,10 +1,10 @@
 from sys import argv
 from time import sleep
-from multiprocessing import Lock, Process
+from multiprocessing import Process
 from Client import *
-import socket
 import rules
 import utils
+from context import TurnContext
 
 
 class SmartClient(Client):
@@ -15,8 +15,12 @@ class SmartClient(Client):
                  port,
                  rules_order=None,
                  load_strategy_from_file=False,
-                 print_to_console=False):
-        Client.__init__(self, player_name, ip, port)
+                 print_to_console=False,
+                 codec=PICKLE_CODEC,
+                 subscribe=False,
+                 table=None,
+                 session=None):
+        Client.__init__(self, player_name, ip, port, codec, subscribe, table)
         if rules_order is not None:
             self.rules_order = rules_order
         elif load_strategy_from_file:
@@ -26,6 +30,35 @@ class SmartClient(Client):
 
         self.last_hinted_card = None
         self.print_to_console = print_to_console
+        # Pipe end of a session (see session.py): it gives the (strategy, seed) of every game
+        # and gets its score back, the client stays connected until it gives None
+        self.session = session
+
+    def resetGameState(self):
+        Client.resetGameState(self)
+        self.last_hinted_card = None
+
+    def nextGame(self):
+        """takes the strategy and seed of the next game from the session, returns False once there is none"""
+        job = self.session.recv()
+        if job is None:
+            return False
+        self.rules_order, self.seed = job
+        return True
+
+    def gameOver(self, _socket):
+        """in a session, reports the score and joins the next game on the same connection"""
+        if self.session is None:
+            Client.gameOver(self, _socket)
+            return
+        self.session.send(utils.getScoreFromClients([self]))
+        if not self.nextGame():
+            self.running = False
+            return
+        self.resetGameState()
+        framing.sendData(
+            _socket, GameData.ClientPlayerStartRequest(self.player_name, self.seed),
+            self.codec)
 
     def generateRandomMove(self):
         """Generates a random valid move"""
@@ -34,7 +67,7 @@ class SmartClient(Client):
 
         valid = False
         while not valid:
-            move = random.choice(GAME_MOVES)
+            move = self.rng.choice(GAME_MOVES)
             if move == "discard" and self.game_data["usedNoteTokens"] == 0:
                 continue
             if move == "hint" and self.game_data["usedNoteTokens"] == 8:
@@ -53,79 +86,97 @@ class SmartClient(Client):
         if not type(hintFromServer) is GameData.ServerHintData:
             pass
         elif self.player_name == hintFromServer.destination:
-            for pos in hintFromServer.positions:
-                self.knowledge[pos][hintFromServer.type] = hintFromServer.value
-                self.last_hinted_card = pos
+            self.noteHint(hintFromServer.type, hintFromServer.value, hintFromServer.positions)
+            self.last_hinted_card = hintFromServer.positions[-1]
         else:
             pass
 
-    def start(self, _lock):
-        """Runs player instance"""
-
-        policy = rules.getRulesInOrder(self.rules_order)
-
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    def dropSlot(self, index):
+        Client.dropSlot(self, index)
+        # The last hinted card shifts with its slot, or is gone
+        if self.last_hinted_card == index:
+            self.last_hinted_card = None
+        elif self.last_hinted_card is not None and self.last_hinted_card > index:
+            self.last_hinted_card -= 1
+
+    def playTurn(self, policy, _socket):
+        """tries the rules in policy order until the server accepts a move"""
+        # Derived quantities are computed once per turn and shared by the rules
+        context = TurnContext(self)
+
+        # Rule selection phase
+        data = None
+        invalid_action = False
+        for rule in policy:
+            move, err = rule(self, context)
+            if err:
+                continue
+            self.playMove(move, _socket)
+            if self.print_to_console:
+                print(f"{self.player_name} plays: {move}")
+            data, invalid_action = self.listen(_socket)
+            if not invalid_action:
+                self.receiveHint(data)
+                break
+
+        self.receiveHint(data)
+
+    def isTurnEvent(self, data):
+        """tells if the local state is up to date after the message, so the player in turn can move"""
+        if self.subscribe:
+            # The first state and the delta following every move
+            return type(data) in (GameData.ServerGameStateData,
+                                  GameData.ServerGameStateDelta)
+        # The game start (read along with the start request answer when there is a socket) and every move,
+        # the state is asked when playing
+        return type(data) in (GameData.ServerPlayerStartRequestAccepted,
+                              GameData.ServerStartGameData,
+                              GameData.ServerActionValid,
+                              GameData.ServerPlayerMoveOk,
+                              GameData.ServerPlayerThunderStrike,
+                              GameData.ServerHintData)
+
+    def start(self):
+        """Runs player instance: waits for the server messages and moves when they make it its turn"""
+
+        if self.session is not None and not self.nextGame():
+            return
+
+        with self.openSocket() as s:
 
             self.connectToServer(s)
             self.ready = True
 
             while self.running:
-                hint, _ = self.listen(s)
+                message = self.listen(s)
+                if message is None:
+                    # Connection closed by the server
+                    break
+                data, _ = message
 
                 if not self.running:
                     self.dumpResults()
                     break
 
-                self.receiveHint(hint)
+                self.receiveHint(data)
 
-                # Wait for other players to join
-                if self.ready & (not self.all_ready):
+                if not (self.all_ready and self.isTurnEvent(data) and self.isMyTurn()):
                     continue
 
-                try:
-                    _lock.acquire()
+                # Only the player in turn needs the state: nobody else can move until it does,
+                # so the next message is the answer
+                if not self.subscribe:
                     self.playMove("show", s)
-                    data, _ = self.listen(s)
-                except:
-                    print(
-                        f"{self.player_name} crashed while waiting for its turn"
-                    )
-                finally:
-                    _lock.release()
-
-                if self.isMyTurn():
-                    _lock.acquire()
-                    try:
-                        self.playMove("show", s)
-                        data, _ = self.listen(s)
-                        self.receiveHint(data)
-
-                        # Rule selection phase
-                        invalid_action = False
-                        for rule in policy:
-                            move, err = rule(self)
-                            if err:
-                                continue
-                            self.playMove(move, s)
-                            if self.print_to_console:
-                                print(f"{self.player_name} plays: {move}")
-                            data, invalid_action = self.listen(s)
-                            if not invalid_action:
-                                self.receiveHint(data)
-                                break
-
-                        self.receiveHint(data)
-
-                    finally:
-                        _lock.release()
+                    self.listen(s)
+                self.playTurn(rules.getRulesInOrder(self.rules_order), s)
 
 
 if __name__ == "__main__":
     ip = argv[1]
     port = int(argv[2])
     name = argv[3]
-
-    lock = Lock()
+    # Optional table to join, the server picks one otherwise
+    table = argv[4] if len(argv) > 4 else None
 
     load_strategy_from_file = utils.doWeHaveBestStrategy()
 
@@ -134,6 +185,6 @@ if __name__ == "__main__":
         ip,
         port,
         load_strategy_from_file=load_strategy_from_file,
-        print_to_console=True).start,
-                             args=(lock, ))
+        print_to_console=True,
+        table=table).start)
     player_process.start()
\ No newline at end of file
@@ -0,0 +1,552 @@
+import numpy as np
+from random import Random
+import rules
+import utils
+from game import DECK, NUM_VALUES, COLORS
+
+NUM_CODES = len(COLORS) * NUM_VALUES
+KNOWLEDGE_SLOTS = 5  # clients always keep knowledge of 5 cards, whatever their hand size
+COLOR_OF = np.arange(NUM_CODES) // NUM_VALUES
+VALUE_OF = np.arange(NUM_CODES) % NUM_VALUES + 1
+DECK_COUNTS = np.array(utils.generateCardCounts())
+
+# Move kinds
+NO_MOVE = -1
+PLAY = 0
+DISCARD = 1
+HINT = 2
+
+# Hint types
+COLOR_HINT = 0
+VALUE_HINT = 1
+
+# HINT_CODES[hint type, hint value]: the card codes matching the hint (colors as their index, values from 1 to 5)
+HINT_CODES = np.zeros((2, NUM_VALUES + 1, NUM_CODES), dtype=bool)
+for _value in range(NUM_VALUES + 1):
+    HINT_CODES[COLOR_HINT, _value] = COLOR_OF == _value
+    HINT_CODES[VALUE_HINT, _value] = VALUE_OF == _value
+
+
+class Moves:
+    """
+    The moves proposed by a vectorized rule for a set of games.
+    send: the rule did not return an error, so the move is sent to the server
+    kind: PLAY, DISCARD or HINT
+    slot: hand index of the card to play or discard
+    dest, hint_type, hint_value: the hint (colors as their index, values from 1 to 5)
+    """
+
+    def __init__(self, n) -> None:
+        self.send = np.zeros(n, dtype=bool)
+        self.kind = np.full(n, NO_MOVE)
+        self.slot = np.zeros(n, dtype=int)
+        self.dest = np.zeros(n, dtype=int)
+        self.hint_type = np.zeros(n, dtype=int)
+        self.hint_value = np.zeros(n, dtype=int)
+
+    def set(self, mask, kind, slot=None, dest=None, hint_type=None, hint_value=None):
+        """fills the moves of the games selected by mask"""
+        self.send[mask] = True
+        self.kind[mask] = kind
+        if slot is not None:
+            self.slot[mask] = slot[mask]
+        if dest is not None:
+            self.dest[mask] = dest[mask]
+        if hint_type is not None:
+            self.hint_type[mask] = hint_type[mask]
+        if hint_value is not None:
+            self.hint_value[mask] = hint_value[mask]
+        return self
+
+
+class BatchGame:
+    """
+    N independent games held as NumPy arrays and played in lockstep, one move per game per step.
+    Every seat of a game follows the rule order of that game, with the rules of rules.py rewritten
+    as vectorized functions (BATCH_RULES) over the games, including the client side bookkeeping they
+    rely on (hint beliefs, last hinted card, slots shifting as cards leave the hand).
+    Decks shuffled from a seed are the same as game.Game(seed), random choices of the rules come from
+    a NumPy generator instead of the random module, so single games differ from headless ones
+    only when a random rule fires. Scores are the ones evolve counts (see utils.getScoreFromClients).
+    With decks, the (games x 50) card codes to deal and draw from are given instead of shuffled,
+    and any position can be set up on the arrays before playing (see rollout.py).
+    """
+
+    def __init__(self, strategies, num_players=2, seeds=None, rng=None, decks=None) -> None:
+        # Checked here and not on import: rules.py imports this module through rollout.py
+        assert len(BATCH_RULES) == rules.NUM_EVOLVED_RULES
+        self.strategies = np.asarray(strategies)
+        # Search rules (rules.monteCarloRollout) have no vectorized version
+        searching = self.strategies[self.strategies >= rules.NUM_EVOLVED_RULES]
+        if len(searching) > 0:
+            rule = int(searching[0])
+            raise ValueError(f"rule {rule} ({rules.RULES[rule].__qualname__.split('.')[0]}) cannot be played by batch games")
+        self.n = len(self.strategies)
+        self.num_players = num_players
+        self.rng = np.random.default_rng(rng)
+        hand_size = 5 if num_players < 4 else 4
+        # generatePlayMove/generateDiscardMove refuse higher indices
+        self.max_index = hand_size - 1
+
+        self.decks = np.zeros((self.n, len(DECK)), dtype=int)
+        for g in range(self.n if decks is None else 0):
+            deck = list(DECK)
+            if seeds is not None and seeds[g] is not None:
+                Random(seeds[g]).shuffle(deck)
+            else:
+                deck = self.rng.permutation(deck)
+            self.decks[g] = deck
+        if decks is not None:
+            self.decks[:] = decks
+        self.deck_left = np.full(self.n, len(DECK))
+
+        # Cards are drawn from the end of the deck, as game.Game.start deals them
+        self.hands = np.full((self.n, num_players, KNOWLEDGE_SLOTS), -1)
+        self.hand_sizes = np.zeros((self.n, num_players), dtype=int)
+        for i in range(num_players * hand_size):
+            if num_players < 4:
+                player, slot = i // hand_size, i % hand_size
+            else:
+                player, slot = i % num_players, i // num_players
+            self.hands[:, player, slot] = self.decks[:, len(DECK) - 1 - i]
+        self.hand_sizes[:] = hand_size
+        self.deck_left -= num_players * hand_size
+
+        self.tops = np.zeros((self.n, len(COLORS)), dtype=int)
+        self.discarded = np.zeros((self.n, NUM_CODES), dtype=int)
+        self.note_tokens = np.zeros(self.n, dtype=int)
+        self.storm_tokens = np.zeros(self.n, dtype=int)
+        self.current = np.zeros(self.n, dtype=int)
+        self.last_turn = np.zeros(self.n, dtype=bool)
+        self.last_moves = np.full(self.n, num_players + 1)
+        self.over = np.zeros(self.n, dtype=bool)
+        self.scores = np.zeros(self.n, dtype=int)
+
+        # Client.beliefs of every seat, one boolean per card code instead of a bit, and the draw order of every slot
+        self.beliefs = np.ones((self.n, num_players, KNOWLEDGE_SLOTS, NUM_CODES), dtype=bool)
+        self.last_updates = np.zeros((self.n, num_players, KNOWLEDGE_SLOTS), dtype=int)
+        self.clock = np.zeros(self.n, dtype=int)
+        self.last_hinted = np.full((self.n, num_players), -1)
+
+        # cards the current player cannot see, filled at the start of every step
+        self.unseen = np.zeros((self.n, NUM_CODES), dtype=int)
+
+    # Views of the current player of the given games
+
+    def knowledge(self, games, players):
+        """Client.knowledge of the current players: the color index (or -1) and value (or 0) their beliefs leave"""
+        beliefs = self.beliefs[games, players].reshape(len(games), KNOWLEDGE_SLOTS, len(COLORS), NUM_VALUES)
+        colors_left = beliefs.any(axis=3)
+        values_left = beliefs.any(axis=2)
+        colors = np.where(colors_left.sum(axis=2) == 1, colors_left.argmax(axis=2), -1)
+        values = np.where(values_left.sum(axis=2) == 1, values_left.argmax(axis=2) + 1, 0)
+        return colors, values
+
+    def inHand(self, games, players):
+        """(games x slots) which slots hold a card: as TurnContext.handKnowledge, the slots past the hand are never chosen"""
+        return np.arange(KNOWLEDGE_SLOTS)[None, :] < self.hand_sizes[games, players][:, None]
+
+    def knownPlayable(self, games, players):
+        """(games x slots) which slots are fully known and playable, and which are fully known"""
+        colors, values = self.knowledge(games, players)
+        known = (colors >= 0) & (values > 0) & self.inHand(games, players)
+        tops = np.take_along_axis(self.tops[games], np.maximum(colors, 0), axis=1)
+        return known & (values == tops + 1), known
+
+    def playableCodes(self, games):
+        """(games x 25) which card codes can be played right now"""
+        return VALUE_OF[None, :] == self.tops[games][:, COLOR_OF] + 1
+
+    def slotsPlayability(self, games, players):
+        """(games x slots) probability that each slot of the current player is playable"""
+        counts = self.beliefs[games, players] * self.unseen[games][:, None, :]
+        possible = counts.sum(axis=2)
+        playable = (counts * self.playableCodes(games)[:, None, :]).sum(axis=2)
+        return playable / np.maximum(possible, 1)
+
+    def computeUnseen(self, games):
+        """cards the current player of every game cannot see: not on the table, discarded or in the others' hands"""
+        on_table = VALUE_OF[None, :] <= self.tops[games][:, COLOR_OF]
+        hands = self.hands[games].copy()
+        hands[np.arange(len(games)), self.current[games]] = -1
+        rows = np.repeat(np.arange(len(games)), hands.shape[1] * hands.shape[2])
+        cards = hands.reshape(-1)
+        visible = cards >= 0
+        in_hands = np.bincount(rows[visible] * NUM_CODES + cards[visible],
+                               minlength=len(games) * NUM_CODES).reshape(
+                                   len(games), NUM_CODES)
+        self.unseen[games] = DECK_COUNTS[None, :] - on_table - self.discarded[games] - in_hands
+
+    def randomHint(self, games, players):
+        """a random hint to a random other player, as Client.generateHintMove(random_move=True)"""
+        n = len(games)
+        offset = self.rng.integers(1, self.num_players, size=n)
+        dest = (players + offset) % self.num_players
+        hint_type = self.rng.integers(0, 2, size=n)
+        dest_hands = self.hands[games, dest]
+        valid = dest_hands >= 0
+        # payload chosen uniformly among the distinct colors (values) in the destination hand
+        present = np.zeros((n, NUM_VALUES + 1), dtype=bool)
+        rows = np.repeat(np.arange(n), KNOWLEDGE_SLOTS)[valid.reshape(-1)]
+        cards = dest_hands[valid]
+        attribute = np.where(hint_type[rows] == COLOR_HINT, COLOR_OF[cards], VALUE_OF[cards])
+        present[rows, attribute] = True
+        weights = present * self.rng.random((n, NUM_VALUES + 1))
+        hint_value = weights.argmax(axis=1)
+        # an empty hand makes generateHintMove fail
+        has_cards = valid.any(axis=1)
+        return dest, hint_type, hint_value, has_cards
+
+    # Moves
+
+    def dropSlots(self, games, players, slots):
+        """what Client.dropSlot does to the knowledge of the players: a card of theirs left the hand"""
+        # The slots after the removed one shift down to the last card, which becomes the drawn (unknown) one
+        last = self.hand_sizes[games, players][:, None] - 1
+        index = np.arange(KNOWLEDGE_SLOTS)[None, :]
+        source = index + ((index >= slots[:, None]) & (index < last))
+        drawn = index == last
+        beliefs = np.take_along_axis(self.beliefs[games, players], source[:, :, None], axis=1)
+        beliefs[drawn] = True
+        self.beliefs[games, players] = beliefs
+        self.clock[games] += 1
+        last_updates = np.take_along_axis(self.last_updates[games, players], source, axis=1)
+        last_updates = np.where(drawn, self.clock[games][:, None], last_updates)
+        self.last_updates[games, players] = last_updates
+        # SmartClient.dropSlot: the last hinted card moves with its slot, or is gone
+        hinted = self.last_hinted[games, players]
+        self.last_hinted[games, players] = np.where(hinted == slots, -1, hinted - (hinted > slots))
+
+    def removeCard(self, games, players, slots):
+        """takes a card out of the hands, shifting the following ones, and draws a new one at the end"""
+        self.dropSlots(games, players, slots)
+        n = len(games)
+        rows = np.arange(n)
+        hands = self.hands[games, players]
+        cards = hands[rows, slots]
+        index = np.arange(KNOWLEDGE_SLOTS)[None, :]
+        source = np.minimum(index + (index >= slots[:, None]), KNOWLEDGE_SLOTS - 1)
+        hands = np.take_along_axis(hands, source, axis=1)
+        sizes = self.hand_sizes[games, players] - 1
+        hands[rows, sizes] = -1
+        draw = self.deck_left[games] > 0
+        hands[rows[draw], sizes[draw]] = self.decks[games[draw], self.deck_left[games[draw]] - 1]
+        self.deck_left[games[draw]] -= 1
+        self.hands[games, players] = hands
+        self.hand_sizes[games, players] = sizes + draw
+        return cards
+
+    def applyPlays(self, games, players, slots):
+        cards = self.removeCard(games, players, slots)
+        colors = COLOR_OF[cards]
+        ok = VALUE_OF[cards] == self.tops[games, colors] + 1
+        self.tops[games[ok], colors[ok]] += 1
+        bonus = ok & (VALUE_OF[cards] == NUM_VALUES) & (self.note_tokens[games] > 0)
+        self.note_tokens[games[bonus]] -= 1
+        self.discarded[games[~ok], cards[~ok]] += 1
+        self.storm_tokens[games[~ok]] += 1
+
+    def applyDiscards(self, games, players, slots):
+        cards = self.removeCard(games, players, slots)
+        self.note_tokens[games] -= 1
+        self.discarded[games, cards] += 1
+
+    def applyHints(self, games, dest, hint_type, hint_value):
+        hands = self.hands[games, dest]
+        valid = hands >= 0
+        attribute = np.where(hint_type[:, None] == COLOR_HINT, COLOR_OF[np.maximum(hands, 0)],
+                             VALUE_OF[np.maximum(hands, 0)])
+        positions = valid & (attribute == hint_value[:, None])
+        # Client.noteHint: the hinted slots hold a matching card, all the other slots do not
+        codes = HINT_CODES[hint_type, hint_value][:, None, :]
+        # Slots past the hand are left unknown
+        in_hand = self.inHand(games, dest)
+        self.beliefs[games, dest] &= np.where(positions[:, :, None], codes, ~codes) | ~in_hand[:, :, None]
+        # receiveHint remembers the last position of the hint
+        last = KNOWLEDGE_SLOTS - 1 - np.argmax(positions[:, ::-1], axis=1)
+        self.last_hinted[games, dest] = last
+        self.note_tokens[games] += 1
+
+    def countRequest(self, games):
+        """what game.Game.satisfyRequest does after every move, valid or not, once the deck is empty"""
+        empty = self.deck_left[games] == 0
+        self.last_turn[games[empty]] = True
+        self.last_moves[games[empty]] -= 1
+
+    def endGames(self, games, scores):
+        self.over[games] = True
+        self.scores[games] = scores
+
+    def step(self):
+        """lets the current player of every running game pick and play its move, returns False once all games are over"""
+        games = np.nonzero(~self.over)[0]
+        if len(games) == 0:
+            return False
+        players = self.current[games]
+        self.computeUnseen(games)
+
+        # Clients only see the table of the last game state: the final move never counts in the score
+        table_scores = self.tops[games].sum(axis=1)
+
+        # Rule selection phase: every game walks its own rule order
+        undecided = np.ones(len(games), dtype=bool)
+        chosen = Moves(len(games))
+        for position in range(self.strategies.shape[1]):
+            waiting = np.nonzero(undecided)[0]
+            if len(waiting) == 0:
+                break
+            rule_ids = self.strategies[games[waiting], position]
+            for rule_id in np.unique(rule_ids):
+                local = waiting[rule_ids == rule_id]
+                moves = BATCH_RULES[rule_id](self, games[local], players[local])
+                self.__submit(games, players, local, moves, undecided, chosen)
+
+        # No rule produced a valid move: over the network the player would wait forever
+        stalled = np.nonzero(undecided & ~self.over[games])[0]
+        self.endGames(games[stalled], table_scores[stalled])
+
+        self.applyMoves(games, players, chosen, table_scores)
+        return True
+
+    def applyMoves(self, games, players, chosen, table_scores):
+        """plays the moves to send (all legal) of the players in turn and passes the turn, ending the games that are over"""
+        done = np.nonzero(chosen.send)[0]
+        for kind, apply in ((PLAY, self.applyPlays), (DISCARD, self.applyDiscards)):
+            sel = done[chosen.kind[done] == kind]
+            apply(games[sel], players[sel], chosen.slot[sel])
+        sel = done[chosen.kind[done] == HINT]
+        self.applyHints(games[sel], chosen.dest[sel], chosen.hint_type[sel], chosen.hint_value[sel])
+
+        moved = games[done]
+        self.current[moved] = (self.current[moved] + 1) % self.num_players
+        self.countRequest(moved)
+        ended = (self.tops[moved] == NUM_VALUES).all(axis=1) | (
+            self.storm_tokens[moved] == 3) | (self.last_turn[moved] & (self.last_moves[moved] == 0))
+        self.endGames(moved[ended], table_scores[done][ended])
+
+    def __submit(self, games, players, local, moves, undecided, chosen):
+        """sends the moves of the rule to the server: valid ones are kept, rejected ones let the next rule fire"""
+        sent = local[moves.send]
+        kind = moves.kind[moves.send]
+        slot = moves.slot[moves.send]
+        card_move = kind != HINT
+
+        # A card index the client refuses makes it wait forever
+        refused = card_move & (slot > self.max_index)
+        self.endGames(games[sent[refused]], self.tops[games[sent[refused]]].sum(axis=1))
+        undecided[sent[refused]] = False
+
+        keep = ~refused
+        sent, kind, slot, card_move = sent[keep], kind[keep], slot[keep], card_move[keep]
+        moves_index = np.nonzero(moves.send)[0][keep]
+
+        valid = ~card_move | (slot < self.hand_sizes[games[sent], players[sent]])
+        accepted = sent[valid]
+        undecided[accepted] = False
+        chosen.send[accepted] = True
+        chosen.kind[accepted] = kind[valid]
+        chosen.slot[accepted] = slot[valid]
+        chosen.dest[accepted] = moves.dest[moves_index[valid]]
+        chosen.hint_type[accepted] = moves.hint_type[moves_index[valid]]
+        chosen.hint_value[accepted] = moves.hint_value[moves_index[valid]]
+
+        # A rejected move still counts for the end of the game
+        rejected = sent[~valid]
+        self.countRequest(games[rejected])
+        ended = self.last_turn[games[rejected]] & (self.last_moves[games[rejected]] == 0)
+        self.endGames(games[rejected[ended]], self.tops[games[rejected[ended]]].sum(axis=1))
+        undecided[rejected[ended]] = False
+
+    def play(self):
+        """plays all the games until the end and returns their scores"""
+        while self.step():
+            pass
+        return self.scores
+
+
+## VECTORIZED RULES
+# Each one mirrors the rule of rules.RULES with the same index for the current player of the given games
+
+
+def firstTrue(mask):
+    return np.argmax(mask, axis=1)
+
+
+def playIfCertain(batch, games, players):
+    playable, _ = batch.knownPlayable(games, players)
+    return Moves(len(games)).set(playable.any(axis=1), PLAY, slot=firstTrue(playable))
+
+
+def playJustHintedCard(batch, games, players):
+    slot = batch.last_hinted[games, players]
+    playable, _ = batch.knownPlayable(games, players)
+    send = (slot >= 0) & playable[np.arange(len(games)), np.maximum(slot, 0)]
+    return Moves(len(games)).set(send, PLAY, slot=slot)
+
+
+def partnersPlayableCard(batch, games, players):
+    """first playable card in the other players' hands, in turn and hand order"""
+    hands = batch.hands[games]
+    colors = COLOR_OF[np.maximum(hands, 0)]
+    playable = (hands >= 0) & (VALUE_OF[np.maximum(hands, 0)] == np.take_along_axis(
+        batch.tops[games], colors.reshape(len(games), -1), axis=1).reshape(hands.shape) + 1)
+    playable[np.arange(len(games)), players] = False
+    flat = playable.reshape(len(games), -1)
+    first = firstTrue(flat)
+    dest = first // KNOWLEDGE_SLOTS
+    card = hands.reshape(len(games), -1)[np.arange(len(games)), first]
+    return flat.any(axis=1), dest, COLOR_OF[np.maximum(card, 0)], VALUE_OF[np.maximum(card, 0)]
+
+
+def hintPlayableCardWith(choose_type):
+
+    def rule(batch, games, players):
+        found, dest, color, value = partnersPlayableCard(batch, games, players)
+        hint_type = choose_type(batch, len(games))
+        hint_value = np.where(hint_type == COLOR_HINT, color, value)
+        send = (batch.note_tokens[games] < 8) & found
+        return Moves(len(games)).set(send, HINT, dest=dest, hint_type=hint_type, hint_value=hint_value)
+
+    return rule
+
+
+hintPlayableCard = hintPlayableCardWith(lambda batch, n: batch.rng.integers(0, 2, size=n))
+hintValuePlayableCard = hintPlayableCardWith(lambda batch, n: np.full(n, VALUE_HINT))
+hintColorPlayableCard = hintPlayableCardWith(lambda batch, n: np.full(n, COLOR_HINT))
+
+
+def hintValueToNextPlayer(value):
+
+    def rule(batch, games, players):
+        dest = (players + 1) % batch.num_players
+        has_value = (VALUE_OF[np.maximum(batch.hands[games, dest], 0)] == value) & (batch.hands[games, dest] >= 0)
+        send = (batch.note_tokens[games] < 8) & has_value.any(axis=1)
+        n = len(games)
+        return Moves(n).set(send, HINT, dest=dest, hint_type=np.full(n, VALUE_HINT), hint_value=np.full(n, value))
+
+    return rule
+
+
+hintOnes = hintValueToNextPlayer(1)
+hintFives = hintValueToNextPlayer(5)
+
+
+def discardUseless(batch, games, players):
+    playable, known = batch.knownPlayable(games, players)
+    useless = known & ~playable
+    send = (batch.note_tokens[games] > 0) & useless.any(axis=1)
+    return Moves(len(games)).set(send, DISCARD, slot=firstTrue(useless))
+
+
+def hintRandom(batch, games, players):
+    dest, hint_type, hint_value, has_cards = batch.randomHint(games, players)
+    send = (batch.note_tokens[games] < 8) & has_cards
+    return Moves(len(games)).set(send, HINT, dest=dest, hint_type=hint_type, hint_value=hint_value)
+
+
+def playRandomMove(batch, games, players):
+    n = len(games)
+    # uniform among the legal move kinds, as the rejection loop of generateRandomMove
+    allowed = np.stack([
+        np.ones(n, dtype=bool), batch.note_tokens[games] > 0, batch.note_tokens[games] < 8
+    ], axis=1)
+    kind = (allowed * batch.rng.random((n, 3))).argmax(axis=1)
+    highest = np.maximum(0, np.minimum(batch.max_index, batch.hand_sizes[games, players] - 1))
+    slot = batch.rng.integers(0, highest + 1)
+    dest, hint_type, hint_value, has_cards = batch.randomHint(games, players)
+    moves = Moves(n)
+    moves.set(kind == PLAY, PLAY, slot=slot)
+    moves.set(kind == DISCARD, DISCARD, slot=slot)
+    moves.set((kind == HINT) & has_cards, HINT, dest=dest, hint_type=hint_type, hint_value=hint_value)
+    return moves
+
+
+def bestSlotAbove(probabilities, threshold):
+    """first slot with the highest probability, if it reaches the threshold"""
+    candidates = np.where(probabilities >= threshold, probabilities, -1)
+    return candidates.max(axis=1) >= threshold, firstTrue(candidates == candidates.max(axis=1)[:, None])
+
+
+def probablySafePlayMove(threshold):
+
+    def rule(batch, games, players):
+        probabilities = np.where(batch.inHand(games, players), batch.slotsPlayability(games, players), -1)
+        send, slot = bestSlotAbove(probabilities, threshold)
+        return Moves(len(games)).set(send, PLAY, slot=slot)
+
+    return rule
+
+
+def probablySafePlayMoveWithStormTokensLeft(threshold):
+
+    def rule(batch, games, players):
+        moves = probablySafePlayMove(threshold)(batch, games, players)
+        moves.send &= batch.storm_tokens[games] < 2
+        return moves
+
+    return rule
+
+
+def discardOldest(only_unidentified):
+
+    def rule(batch, games, players):
+        colors, values = batch.knowledge(games, players)
+        candidates = batch.inHand(games, players)
+        if only_unidentified:
+            candidates &= (colors < 0) & (values == 0)
+        last_updates = np.where(candidates, batch.last_updates[games, players], np.iinfo(int).max)
+        send = (batch.note_tokens[games] > 0) & candidates.any(axis=1)
+        return Moves(len(games)).set(send, DISCARD, slot=np.argmin(last_updates, axis=1))
+
+    return rule
+
+
+def discardUnidentifiedCard(batch, games, players):
+    colors, values = batch.knowledge(games, players)
+    unidentified = (colors < 0) & (values == 0) & batch.inHand(games, players)
+    send = (batch.note_tokens[games] > 0) & unidentified.any(axis=1)
+    return Moves(len(games)).set(send, DISCARD, slot=firstTrue(unidentified))
+
+
+def probablySafeDiscardMove(threshold):
+
+    def rule(batch, games, players):
+        probabilities = np.where(batch.inHand(games, players), 1 - batch.slotsPlayability(games, players), -1)
+        send, slot = bestSlotAbove(probabilities, threshold)
+        # as rules.probablySafeDiscardMove, the chosen card is played
+        return Moves(len(games)).set(send, PLAY, slot=slot)
+
+    return rule
+
+
+BATCH_RULES = [
+    playIfCertain,  # 0
+    playJustHintedCard,  # 1
+    hintPlayableCard,  # 2
+    hintValuePlayableCard,  # 3
+    hintColorPlayableCard,  # 4
+    hintOnes,  # 5
+    hintFives,  # 6
+    discardUseless,  # 7
+    hintRandom,  # 8
+    playRandomMove,  # 9
+    probablySafePlayMove(1),  # 10
+    probablySafePlayMove(0.8),  # 11
+    probablySafePlayMove(0.65),  # 12
+    probablySafePlayMove(0.5),  # 13
+    probablySafePlayMoveWithStormTokensLeft(0.6),  # 14
+    probablySafePlayMoveWithStormTokensLeft(0.4),  # 15
+    probablySafePlayMoveWithStormTokensLeft(0.2),  # 16
+    discardOldest(only_unidentified=True),  # 17
+    discardOldest(only_unidentified=False),  # 18
+    discardUnidentifiedCard,  # 19
+    playRandomMove,  # 20
+    probablySafeDiscardMove(0.8),  # 21
+    probablySafeDiscardMove(0.65),  # 22
+    probablySafeDiscardMove(0.5),  # 23
+]
+
+
+def playBatchGames(strategies, num_players=2, seeds=None, rng=None):
+    """plays one game per strategy (and seed) in lockstep and returns the scores"""
+    return BatchGame(strategies, num_players, seeds, rng).play()
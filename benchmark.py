@@ -0,0 +1,236 @@
+import copy
+import random
+import timeit
+import numpy as np
+import utils
+import batch
+import rollout
+import rules
+import headless
+import framing
+import GameData
+import server
+import session
+import transport
+from sys import argv
+from contextlib import redirect_stdout
+from io import StringIO
+from game import Card, Game
+from constants import PICKLE_CODEC, BINARY_CODEC
+
+REPETITIONS = 2000
+BATCH_GAMES = 5000
+HEADLESS_GAMES = 100
+CODEC_MESSAGES = 20000
+TRANSPORT_ROUND_TRIPS = 5000
+TRANSPORT_GAMES = 20
+TRANSPORTS = ["tcp://127.0.0.1:0", "unix://", "socketpair"]
+ROLLOUT_GAMES = 5
+
+
+def randomPlayabilityState():
+    """builds a random mid-game situation: table, unseen cards and what we know of a 5 cards hand"""
+    table_cards = {}
+    unseen_cards = utils.generateCardCounts()
+    for color in utils.COLORS:
+        top = random.randint(0, 5)
+        table_cards[color] = [Card(0, value, color) for value in range(1, top + 1)]
+        for value in range(1, top + 1):
+            unseen_cards[utils.cardIndex(color, value)] -= 1
+    # cards in the other players' hands and in the discard pile
+    for _ in range(random.randint(0, 20)):
+        index = random.choice([i for i in range(25) if unseen_cards[i] > 0])
+        unseen_cards[index] -= 1
+
+    knowledge = []
+    for _ in range(5):
+        knowledge.append({
+            "color": random.choice([None, random.choice(utils.COLORS)]),
+            "value": random.choice([None, random.choice(utils.VALUES)])
+        })
+
+    return table_cards, unseen_cards, knowledge
+
+
+def knowledgeBeliefs(knowledge):
+    """the beliefs of slots we only know the given colors and values of (see Client.beliefs)"""
+    beliefs = []
+    for card_dict in knowledge:
+        belief = utils.FULL_BELIEF
+        if card_dict["color"] is not None:
+            belief &= utils.COLOR_BITS[card_dict["color"]]
+        if card_dict["value"] is not None:
+            belief &= utils.VALUE_BITS[card_dict["value"]]
+        beliefs.append(belief)
+    return beliefs
+
+
+def slotPlayability(belief, unseen_cards, table_cards):
+    """playability of one slot, looping over the cards its belief allows"""
+    possible = 0
+    playable = 0
+    for color in utils.COLORS:
+        for value in utils.VALUES:
+            code = utils.cardIndex(color, value)
+            if belief & (1 << code):
+                possible += unseen_cards[code]
+                if value == len(table_cards[color]) + 1:
+                    playable += unseen_cards[code]
+    return playable / possible if possible > 0 else 0
+
+
+def benchmarkPlayability():
+    """compares the playability of the slots computed one by one with the vectorized one over the whole hand"""
+    states = [randomPlayabilityState() for _ in range(REPETITIONS)]
+    # Clients keep their beliefs up to date as hints come, they are not part of the timing
+    beliefs = [knowledgeBeliefs(knowledge) for _, _, knowledge in states]
+
+    def perSlot():
+        return [[
+            slotPlayability(belief, unseen_cards, table_cards)
+            for belief in slots_beliefs
+        ] for (table_cards, unseen_cards, _), slots_beliefs in zip(states, beliefs)]
+
+    def fromBeliefs():
+        return [
+            utils.calculatePlayabilityVector(utils.beliefMasks(slots_beliefs),
+                                             unseen_cards, table_cards)[0]
+            for (table_cards, unseen_cards, _), slots_beliefs in zip(states, beliefs)
+        ]
+
+    expected = perSlot()
+    assert [list(p) for p in fromBeliefs()] == expected
+
+    for name, function in [("per slot", perSlot),
+                           ("calculatePlayabilityVector", fromBeliefs)]:
+        elapsed = min(timeit.repeat(function, number=1, repeat=3))
+        print(f"{name}: {elapsed / REPETITIONS * 1e6:.1f} us per hand")
+
+
+def benchmarkBatch():
+    """compares games per second of headless.py with the lockstep games of batch.py, on random strategies"""
+    strategies = [np.random.permutation(24) for _ in range(BATCH_GAMES)]
+    seeds = list(range(BATCH_GAMES))
+
+    # Games where no random rule fires must end with the same score
+    deterministic = [0, 1, 3, 4, 5, 6, 7, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 21, 22, 23, 2, 8, 9, 20]
+    with redirect_stdout(StringIO()):
+        expected = [headless.playHeadlessGame(deterministic, seed=seed) for seed in seeds[:HEADLESS_GAMES]]
+    assert list(batch.playBatchGames([deterministic] * HEADLESS_GAMES, seeds=seeds[:HEADLESS_GAMES])) == expected
+
+    with redirect_stdout(StringIO()):
+        elapsed = min(timeit.repeat(lambda: [
+            headless.playHeadlessGame(list(strategy), seed=seed)
+            for strategy, seed in zip(strategies[:HEADLESS_GAMES], seeds)
+        ], number=1, repeat=3))
+    print(f"playHeadlessGame: {HEADLESS_GAMES / elapsed:.0f} games per second")
+    elapsed = min(timeit.repeat(lambda: batch.playBatchGames(strategies, seeds=seeds), number=1, repeat=3))
+    print(f"playBatchGames ({BATCH_GAMES} games): {BATCH_GAMES / elapsed:.0f} games per second")
+
+
+def benchmarkCodec():
+    """compares the codecs speed and frame sizes (their round trips are checked by test_binarycodec.py)"""
+    game = Game(seed=0)
+    for name in ["alice", "bob", "carol"]:
+        game.addPlayer(name)
+    game.start()
+    # the traffic is mostly game states and show requests
+    state, _ = game.satisfyRequest(GameData.ClientGetGameStateRequest("alice"), "alice")
+    show = GameData.ClientGetGameStateRequest("alice")
+    for codec in (PICKLE_CODEC, BINARY_CODEC):
+        frames = [framing.encodeFrame(message, codec) for message in (state, show)]
+        encoding = min(timeit.repeat(lambda: [framing.encodeFrame(state, codec) for _ in range(CODEC_MESSAGES)], number=1, repeat=3))
+        decoding = min(timeit.repeat(lambda: [framing.decodeFrame(frames[0]) for _ in range(CODEC_MESSAGES)], number=1, repeat=3))
+        print(f"{codec}: game state {len(frames[0])} bytes, show request {len(frames[1])} bytes, "
+              f"{CODEC_MESSAGES / encoding:.0f} game states encoded and {CODEC_MESSAGES / decoding:.0f} decoded per second")
+
+
+def benchmarkTransport():
+    """compares request round trips and socket games per second of the transports of transport.py"""
+    seeds = list(range(TRANSPORT_GAMES))
+    with redirect_stdout(StringIO()):
+        expected = [headless.playHeadlessGame(rules.DEFAULT_ORDER, seed=seed, subscribe=True) for seed in seeds]
+
+    for address in TRANSPORTS:
+        # A lone player asking to start gets an answer but never starts the game
+        server_process, addresses = server.launchServer(2, address=address, seats=1)
+        with transport.connect(addresses[0]) as s:
+            reader = framing.FrameReader(s)
+            framing.sendData(s, GameData.ClientPlayerAddData("alice"), BINARY_CODEC)
+            assert type(reader.read()) is GameData.ServerPlayerConnectionOk
+            request = GameData.ClientPlayerStartRequest("alice")
+
+            def roundTrips():
+                for _ in range(TRANSPORT_ROUND_TRIPS):
+                    framing.sendData(s, request, BINARY_CODEC)
+                    reader.read()
+
+            elapsed = min(timeit.repeat(roundTrips, number=1, repeat=3))
+        server_process.join()
+
+        with redirect_stdout(StringIO()):
+            games = session.SocketSession(codec=BINARY_CODEC, subscribe=True, address=address)
+            start = timeit.default_timer()
+            scores = [games.play(rules.DEFAULT_ORDER, seed) for seed in seeds]
+            games_elapsed = timeit.default_timer() - start
+            games.close()
+        assert scores == expected, address
+        print(f"{address}: {elapsed / TRANSPORT_ROUND_TRIPS * 1e6:.1f} us per request round trip, "
+              f"{TRANSPORT_GAMES / games_elapsed:.1f} games per second")
+
+
+def benchmarkRollout():
+    """times the turns of the Monte Carlo rollout rule against its budget, and compares its scores with the default order"""
+    times = []
+    best_move = rollout.bestMove
+
+    def timedBestMove(client, context, budget):
+        start = timeit.default_timer()
+        move = best_move(client, context, budget)
+        times.append(timeit.default_timer() - start)
+        return move
+
+    seeds = list(range(ROLLOUT_GAMES))
+    rollout.bestMove = timedBestMove
+    try:
+        with redirect_stdout(StringIO()):
+            scores = [headless.playHeadlessGame([24] + rules.DEFAULT_ORDER, seed=seed) for seed in seeds]
+    finally:
+        rollout.bestMove = best_move
+    with redirect_stdout(StringIO()):
+        expected = [headless.playHeadlessGame(rules.DEFAULT_ORDER, seed=seed) for seed in seeds]
+
+    # A turn overruns its budget by at most the step of the simulated games running at the deadline
+    assert max(times) < rollout.BUDGET * 1.5, max(times)
+    print(f"monteCarloRollout: {np.mean(times) * 1e3:.1f} ms per turn (max {max(times) * 1e3:.1f} ms, budget {rollout.BUDGET * 1e3:.0f} ms)")
+    print(f"mean score over {ROLLOUT_GAMES} seeds: {np.mean(scores):.2f} with the rollout rule first, {np.mean(expected):.2f} with the default order")
+
+
+def benchmarkSnapshot():
+    """times snapshots against deepcopy (searched games playing as straight ones is checked by test_snapshot.py)"""
+    game = Game(seed=0)
+    for name in ["alice", "bob", "carol"]:
+        game.addPlayer(name)
+    game.start()
+    state = game.snapshot()
+    for name, function in [("snapshot", game.snapshot),
+                           ("restore", lambda: game.restore(state)),
+                           ("deepcopy", lambda: copy.deepcopy(game))]:
+        elapsed = min(timeit.repeat(function, number=REPETITIONS, repeat=3))
+        print(f"{name}: {elapsed / REPETITIONS * 1e6:.2f} us per game")
+
+
+BENCHMARKS = {
+    "playability": benchmarkPlayability,
+    "batch": benchmarkBatch,
+    "codec": benchmarkCodec,
+    "transport": benchmarkTransport,
+    "rollout": benchmarkRollout,
+    "snapshot": benchmarkSnapshot,
+}
+
+if __name__ == "__main__":
+    names = argv[1:] if len(argv) > 1 else BENCHMARKS.keys()
+    for name in names:
+        print(f"--- {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,265 @@
+import pickle
+import struct
+import GameData
+from game import CARDS, Player
+
+# A binary payload starts with the id of its message type, a pickled one with the PROTO opcode
+PICKLE_PROTO = 0x80
+NO_CARD = 0xFF
+NO_STRING = 0xFFFF
+
+SHORT = struct.Struct("<H")
+INT = struct.Struct("<i")
+UINT = struct.Struct("<I")
+
+## FIELD TYPES
+# Every type is a (write, read) pair: write appends the value to a bytearray,
+# read returns the value found at an offset of the payload and the offset after it
+
+
+def writeString(out, value):
+    if value is None:
+        out += SHORT.pack(NO_STRING)
+        return
+    encoded = value.encode()
+    out += SHORT.pack(len(encoded))
+    out += encoded
+
+
+def readString(payload, offset):
+    (size,) = SHORT.unpack_from(payload, offset)
+    offset += SHORT.size
+    if size == NO_STRING:
+        return None, offset
+    return payload[offset:offset + size].decode(), offset + size
+
+
+def writeInt(out, value):
+    out += INT.pack(value)
+
+
+def readInt(payload, offset):
+    return INT.unpack_from(payload, offset)[0], offset + INT.size
+
+
+def writeCard(out, card):
+    # cards are single bytes: their id in the game.CARDS flyweight table
+    out.append(NO_CARD if card is None else card.id)
+
+
+def readCard(payload, offset):
+    card_id = payload[offset]
+    return (None if card_id == NO_CARD else CARDS[card_id]), offset + 1
+
+
+def writeList(write_item):
+
+    def write(out, values):
+        out.append(len(values))
+        for value in values:
+            write_item(out, value)
+
+    return write
+
+
+def readList(read_item):
+
+    def read(payload, offset):
+        size = payload[offset]
+        offset += 1
+        values = []
+        for _ in range(size):
+            value, offset = read_item(payload, offset)
+            values.append(value)
+        return values, offset
+
+    return read
+
+
+def writeCards(out, cards):
+    out.append(len(cards))
+    out += bytes(card.id for card in cards)
+
+
+def readCards(payload, offset):
+    size = payload[offset]
+    ids = payload[offset + 1:offset + 1 + size]
+    return [CARDS[card_id] for card_id in ids], offset + 1 + size
+
+
+def writePlayer(out, player):
+    writeString(out, player.name)
+    out.append(player.ready)
+    writeCards(out, player.hand)
+
+
+def readPlayer(payload, offset):
+    name, offset = readString(payload, offset)
+    player = Player(name)
+    player.ready = bool(payload[offset])
+    player.hand, offset = readCards(payload, offset + 1)
+    return player, offset
+
+
+def writeTable(out, table):
+    out.append(len(table))
+    for color, cards in table.items():
+        writeString(out, color)
+        writeCards(out, cards)
+
+
+def readTable(payload, offset):
+    size = payload[offset]
+    offset += 1
+    table = {}
+    for _ in range(size):
+        color, offset = readString(payload, offset)
+        table[color], offset = readCards(payload, offset)
+    return table, offset
+
+
+def writeHandChanges(out, changes):
+    out.append(len(changes))
+    for name, (index, card) in changes.items():
+        writeString(out, name)
+        out.append(index)
+        writeCard(out, card)
+
+
+def readHandChanges(payload, offset):
+    size = payload[offset]
+    offset += 1
+    changes = {}
+    for _ in range(size):
+        name, offset = readString(payload, offset)
+        card, next_offset = readCard(payload, offset + 1)
+        changes[name] = (payload[offset], card)
+        offset = next_offset
+    return changes, offset
+
+
+def writeHintValue(out, value):
+    # a color name or a card value
+    if isinstance(value, int):
+        out.append(0)
+        writeInt(out, value)
+    else:
+        out.append(1)
+        writeString(out, value)
+
+
+def readHintValue(payload, offset):
+    if payload[offset] == 0:
+        return readInt(payload, offset + 1)
+    return readString(payload, offset + 1)
+
+
+def writeAny(out, value):
+    # free-form fields are usually strings, anything else is pickled
+    if isinstance(value, str):
+        out.append(0)
+        writeString(out, value)
+    else:
+        encoded = pickle.dumps(value)
+        out.append(1)
+        out += UINT.pack(len(encoded))
+        out += encoded
+
+
+def readAny(payload, offset):
+    if payload[offset] == 0:
+        return readString(payload, offset + 1)
+    (size,) = UINT.unpack_from(payload, offset + 1)
+    offset += 1 + UINT.size
+    return pickle.loads(payload[offset:offset + size]), offset + size
+
+
+STRING = (writeString, readString)
+NUMBER = (writeInt, readInt)
+CARD = (writeCard, readCard)
+CARD_LIST = (writeCards, readCards)
+STRING_LIST = (writeList(writeString), readList(readString))
+NUMBER_LIST = (writeList(writeInt), readList(readInt))
+PLAYER_LIST = (writeList(writePlayer), readList(readPlayer))
+TABLE = (writeTable, readTable)
+HAND_CHANGES = (writeHandChanges, readHandChanges)
+HINT_VALUE = (writeHintValue, readHintValue)
+ANY = (writeAny, readAny)
+
+## SCHEMAS
+# The fields of every message, in the order of its constructor arguments.
+# Decoding calls the constructor with them and then sets them again as attributes,
+# since a few constructors store their arguments under another name (e.g. ServerHintData.source)
+SCHEMAS = {
+    GameData.ClientHintData: [("sender", STRING), ("destination", STRING),
+                              ("type", STRING), ("value", HINT_VALUE)],
+    GameData.ClientPlayerAddData: [("sender", STRING), ("table", STRING), ("seed", ANY)],
+    GameData.ClientPlayerStartRequest: [("sender", STRING), ("seed", ANY)],
+    GameData.ClientPlayerReadyData: [("sender", STRING)],
+    GameData.ClientGetGameStateRequest: [("sender", STRING)],
+    GameData.ClientStateSubscriptionRequest: [("sender", STRING)],
+    GameData.ClientBotSeatRequest: [("sender", STRING), ("name", STRING), ("rulesOrder", NUMBER_LIST),
+                                    ("table", STRING), ("seed", ANY)],
+    GameData.ClientPlayerDiscardCardRequest: [("sender", STRING),
+                                              ("handCardOrdered", NUMBER)],
+    GameData.ClientPlayerPlayCardRequest: [("sender", STRING),
+                                           ("handCardOrdered", NUMBER)],
+    GameData.ServerHintData: [("source", STRING), ("destination", STRING),
+                              ("type", STRING), ("value", HINT_VALUE),
+                              ("positions", NUMBER_LIST), ("player", STRING)],
+    GameData.ServerPlayerConnectionOk: [("message", STRING), ("table", STRING)],
+    GameData.ServerPlayerStartRequestAccepted: [("connectedPlayers", NUMBER),
+                                                ("acceptedStartRequests", NUMBER)],
+    GameData.ServerStartGameData: [("players", STRING_LIST)],
+    GameData.ServerGameStateData: [("currentPlayer", STRING), ("handSize", NUMBER),
+                                   ("players", PLAYER_LIST), ("usedNoteTokens", NUMBER),
+                                   ("usedStormTokens", NUMBER), ("tableCards", TABLE),
+                                   ("discardPile", CARD_LIST)],
+    GameData.ServerGameStateDelta: [("currentPlayer", STRING), ("handSize", NUMBER),
+                                    ("handChanges", HAND_CHANGES), ("playedCards", CARD_LIST),
+                                    ("discardedCards", CARD_LIST), ("usedNoteTokens", NUMBER),
+                                    ("usedStormTokens", NUMBER)],
+    GameData.ServerActionValid: [("player", STRING), ("lastPlayer", STRING),
+                                 ("action", STRING), ("card", CARD),
+                                 ("cardHandIndex", NUMBER), ("handLength", NUMBER)],
+    GameData.ServerPlayerMoveOk: [("player", STRING), ("lastPlayer", STRING),
+                                  ("card", CARD), ("cardHandIndex", NUMBER),
+                                  ("handLength", NUMBER)],
+    GameData.ServerPlayerThunderStrike: [("player", STRING), ("lastPlayer", STRING),
+                                         ("card", CARD), ("cardHandIndex", NUMBER),
+                                         ("handLength", NUMBER)],
+    GameData.ServerActionInvalid: [("message", ANY)],
+    GameData.ServerInvalidDataReceived: [("data", ANY)],
+    GameData.ServerGameOver: [("score", NUMBER), ("scoreMessage", STRING)],
+}
+MESSAGE_TYPES = list(SCHEMAS.keys())
+TYPE_IDS = {message_type: i + 1 for i, message_type in enumerate(MESSAGE_TYPES)}
+assert len(MESSAGE_TYPES) < PICKLE_PROTO
+
+
+def isBinary(payload):
+    """tells a binary payload from a pickled one"""
+    return payload[0] != PICKLE_PROTO
+
+
+def encode(data: GameData.GameData) -> bytes:
+    """packs a message into a payload: its type id followed by its fields"""
+    out = bytearray()
+    out.append(TYPE_IDS[type(data)])
+    for name, (write, _) in SCHEMAS[type(data)]:
+        write(out, getattr(data, name))
+    return bytes(out)
+
+
+def decode(payload: bytes) -> GameData.GameData:
+    """rebuilds the message packed by encode"""
+    message_type = MESSAGE_TYPES[payload[0] - 1]
+    offset = 1
+    values = []
+    for _, (_, read) in SCHEMAS[message_type]:
+        value, offset = read(payload, offset)
+        values.append(value)
+    data = message_type(*values)
+    for (name, _), value in zip(SCHEMAS[message_type], values):
+        setattr(data, name, value)
+    return data
@@ -0,0 +1,169 @@
+import asyncio
+import GameData
+import framing
+import rules
+import server
+import transport
+import utils
+from SmartClient import SmartClient
+from context import TurnContext
+from constants import BINARY_CODEC
+
+NUM_PLAYERS = 2
+
+
+class AsyncSeat:
+    """
+    A SmartClient seat played on an asyncio connection, so that many seats share one process and event loop.
+    The client keeps its protocol handling (processData) and its policy, the seat only reads and writes
+    the messages SmartClient.start would read and write on its blocking socket.
+    """
+
+    def __init__(self, client: SmartClient, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.client = client
+        self.reader = reader
+        self.writer = writer
+
+    def send(self, data: GameData.GameData):
+        self.writer.write(framing.encodeFrame(data, self.client.codec))
+
+    async def read(self):
+        """returns the next message and if it reports an invalid action, None once the connection is closed"""
+        frame = await framing.readFrameAsync(self.reader)
+        if frame is None:
+            return None
+        data = framing.decodeFrame(frame)
+        if type(data) is GameData.ServerGameOver:
+            # The score is read from the table of the clients, nothing is saved to file
+            self.client.running = False
+            return data, False
+        return self.client.processData(data)
+
+    async def join(self):
+        """sits at the table of the client and asks to start, as Client.connectToServer"""
+        client = self.client
+        self.send(GameData.ClientPlayerAddData(client.player_name, client.table))
+        data = framing.decodeFrame(await framing.readFrameAsync(self.reader))
+        if type(data) is not GameData.ServerPlayerConnectionOk:
+            raise ConnectionError(f"{client.player_name} refused: {vars(data)}")
+        client.table = data.table
+        client.ready = True
+        if client.subscribe:
+            self.send(GameData.ClientStateSubscriptionRequest(client.player_name))
+        self.send(GameData.ClientPlayerStartRequest(client.player_name, client.seed))
+
+    async def playTurn(self):
+        """
+        tries the rules in policy order until the server accepts a move, as SmartClient.playTurn.
+        returns False if the chosen move cannot be sent (SmartClient would wait forever)
+        """
+        client = self.client
+        context = TurnContext(client)
+        data = None
+        for rule in rules.getRulesInOrder(client.rules_order):
+            move, err = rule(client, context)
+            if err:
+                continue
+            request = client.buildRequest(move) if move is not None else None
+            if request is None:
+                return False
+            self.send(request)
+            data, invalid_action = await self.read()
+            if not invalid_action:
+                client.receiveHint(data)
+                break
+
+        client.receiveHint(data)
+        return True
+
+    async def play(self):
+        """
+        plays until the game is over, moving when the server messages make it the seat's turn.
+        returns False if the game cannot go on
+        """
+        client = self.client
+        try:
+            while client.running:
+                message = await self.read()
+                if message is None:
+                    break
+                data, _ = message
+                client.receiveHint(data)
+
+                # Without a socket the client does not answer the game start by itself
+                if type(data) is GameData.ServerStartGameData:
+                    self.send(GameData.ClientPlayerReadyData(client.player_name))
+
+                if not (client.all_ready and client.isTurnEvent(data) and client.isMyTurn()):
+                    continue
+
+                if not client.subscribe:
+                    self.send(GameData.ClientGetGameStateRequest(client.player_name))
+                    await self.read()
+                if not await self.playTurn():
+                    return False
+            return True
+        finally:
+            self.writer.close()
+
+
+async def joinTable(clients, addresses):
+    """connects the seats of a table one after the other, so the turn order is the seat order"""
+    seats = []
+    for client, address in zip(clients, addresses):
+        reader, writer = await transport.openConnection(address)
+        seat = AsyncSeat(client, reader, writer)
+        await seat.join()
+        seats.append(seat)
+    return seats
+
+
+async def playTable(seats):
+    """plays the game of a table, stopping every seat once one of them cannot move (as headless.py)"""
+    plays = [asyncio.ensure_future(seat.play()) for seat in seats]
+    for play in asyncio.as_completed(plays):
+        if not await play:
+            for other in plays:
+                other.cancel()
+            break
+    await asyncio.gather(*plays, return_exceptions=True)
+
+
+async def playTables(tables, addresses):
+    """plays every table (a list of clients) at once and returns their scores"""
+    size = len(tables[0])
+    joined = await asyncio.gather(*(joinTable(clients, addresses[i * size:(i + 1) * size])
+                                    for i, clients in enumerate(tables)))
+    # Every table exists before any game can end: the server stops once no table is left
+    await asyncio.gather(*(playTable(seats) for seats in joined))
+    return [utils.getScoreFromClients(clients) for clients in tables]
+
+
+def playAsyncGames(strategies, num_players=NUM_PLAYERS, seeds=None, address=transport.SOCKETPAIR,
+                   codec=BINARY_CODEC, subscribe=True):
+    """
+    plays one game per strategy (and seed) against a new server, every seat in this process on one event loop,
+    and returns the scores
+    """
+    if seeds is None:
+        seeds = [None] * len(strategies)
+    tables = []
+    for game, (strategy, seed) in enumerate(zip(strategies, seeds)):
+        clients = []
+        for i in range(num_players):
+            client = SmartClient(f"SmartClient-{i}", None, None, rules_order=list(strategy),
+                                 codec=codec, subscribe=subscribe, table=f"game-{game}")
+            client.seed = seed
+            clients.append(client)
+        tables.append(clients)
+
+    server_process, addresses = server.launchServer(num_players, address=address,
+                                                    seats=num_players * len(strategies))
+    scores = asyncio.run(playTables(tables, addresses))
+    transport.release(addresses)
+    server_process.join()
+    return scores
+
+
+if __name__ == "__main__":
+    print(playAsyncGames([rules.DEFAULT_ORDER] * 100))
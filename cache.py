@@ -0,0 +1,70 @@
+import os
+import pickle
+import rules
+from collections import OrderedDict
+
+CACHE_FILE = "outputs/fitness_cache"
+MAX_ENTRIES = 100000
+# Part of every key: bumped whenever the same rule order plays differently, so older fitnesses are not reused
+RULES_VERSION = 3  # 2: hint beliefs (Client.beliefs), 3: no slot past the hand is chosen
+
+
+class FitnessCache:
+    """
+    Least recently used cache of strategy fitnesses.
+    A fitness is only reused when it was obtained with the same number of episodes
+    on the same seeded decks by an equivalent rule order (see rules.canonicalOrder),
+    so a hit is exactly the value the games would give.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, path=CACHE_FILE) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, strategy, episodes, seeds=None):
+        """builds the cache key of a strategy evaluated on [episodes] games with the given seeds"""
+        seeds = tuple(seeds) if seeds is not None else None
+        return (rules.canonicalOrder(strategy), episodes, seeds, RULES_VERSION)
+
+    def get(self, key):
+        """returns the cached fitness or None, marking the entry as recently used"""
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, fitness):
+        """stores a fitness, evicting the least recently used entries if the cache is full"""
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self):
+        """writes the cache to file, replacing the previous one only once fully written"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as binary_file:
+            pickle.dump(self.entries, binary_file)
+        os.replace(temp_path, self.path)
+
+    def load(self):
+        """loads the entries saved by a previous run, if any"""
+        try:
+            with open(self.path, "rb") as binary_file:
+                self.entries = pickle.load(binary_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.entries = OrderedDict()
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return self
@@ -3,21 +3,30 @@
 from sys import argv, stdout
 from threading import Thread
 import GameData
-import socket
+import framing
+import transport
 from constants import *
 import os
 
 
-if len(argv) < 4:
+# Either <IP> <port> <PlayerName> [<TableName>] or <address> <PlayerName> [<TableName>],
+# the address with its transport as the server takes it (tcp://host:port or unix://path, see transport.py)
+args = argv[1:]
+if len(args) > 0 and "://" in args[0]:
+    address = args[0]
+    args = [None, None] + args[1:]
+elif len(args) >= 2:
+    address = (args[0], int(args[1]))
+else:
+    address = (HOST, PORT)
+if len(args) < 3:
     print("You need the player name to start the game.")
     #exit(-1)
     playerName = "Test" # For debug
-    ip = HOST
-    port = PORT
 else:
-    playerName = argv[3]
-    ip = argv[1]
-    port = int(argv[2])
+    playerName = args[2]
+# Optional table to join, the server picks one otherwise
+table = args[3] if len(args) > 3 else None
 
 run = True
 
@@ -37,14 +46,23 @@ def manageInput():
             run = False
             os._exit(0)
         elif command == "ready" and status == statuses[0]:
-            s.send(GameData.ClientPlayerStartRequest(playerName).serialize())
+            framing.sendData(s, GameData.ClientPlayerStartRequest(playerName))
+        elif command.split(" ")[0] == "bot" and status == statuses[0]:
+            # A bot playing inside the server takes a seat at the table
+            try:
+                botStr = command.split(" ")
+                rulesOrder = [int(rule) for rule in botStr[2].split(",")] if len(botStr) > 2 else []
+                framing.sendData(s, GameData.ClientBotSeatRequest(playerName, botStr[1], rulesOrder))
+            except:
+                print("Maybe you wanted to type 'bot <name> [<rule>,<rule>,...]'?")
+                continue
         elif command == "show" and status == statuses[1]:
-            s.send(GameData.ClientGetGameStateRequest(playerName).serialize())
+            framing.sendData(s, GameData.ClientGetGameStateRequest(playerName))
         elif command.split(" ")[0] == "discard" and status == statuses[1]:
             try:
                 cardStr = command.split(" ")
                 cardOrder = int(cardStr[1])
-                s.send(GameData.ClientPlayerDiscardCardRequest(playerName, cardOrder).serialize())
+                framing.sendData(s, GameData.ClientPlayerDiscardCardRequest(playerName, cardOrder))
             except:
                 print("Maybe you wanted to type 'discard <num>'?")
                 continue
@@ -52,7 +70,7 @@ def manageInput():
             try:
                 cardStr = command.split(" ")
                 cardOrder = int(cardStr[1])
-                s.send(GameData.ClientPlayerPlayCardRequest(playerName, cardOrder).serialize())
+                framing.sendData(s, GameData.ClientPlayerPlayCardRequest(playerName, cardOrder))
             except:
                 print("Maybe you wanted to type 'play <num>'?")
                 continue
@@ -73,7 +91,7 @@ def manageInput():
                     if value not in ["green", "red", "blue", "yellow", "white"]:
                         print("Error: card color can only be green, red, blue, yellow or white")
                         continue
-                s.send(GameData.ClientHintData(playerName, destination, t, value).serialize())
+                framing.sendData(s, GameData.ClientHintData(playerName, destination, t, value))
             except:
                 print("Maybe you wanted to type 'hint <type> <destinatary> <value>'?")
                 continue
@@ -84,31 +102,31 @@ def manageInput():
             continue
         stdout.flush()
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    request = GameData.ClientPlayerAddData(playerName)
-    s.connect((HOST, PORT))
-    s.send(request.serialize())
-    data = s.recv(DATASIZE)
-    data = GameData.GameData.deserialize(data)
+with transport.connect(address) as s:
+    request = GameData.ClientPlayerAddData(playerName, table)
+    reader = framing.FrameReader(s)
+    framing.sendData(s, request)
+    data = reader.read()
     if type(data) is GameData.ServerPlayerConnectionOk:
-        print("Connection accepted by the server. Welcome " + playerName)
+        print("Connection accepted by the server. Welcome " + playerName + " to table " + str(data.table))
     print("[" + playerName + " - " + status + "]: ", end="")
     Thread(target=manageInput).start()
     while run:
         dataOk = False
-        data = s.recv(DATASIZE)
-        if not data:
+        data = reader.read()
+        if data is None:
             continue
-        data = GameData.GameData.deserialize(data)
+        if type(data) is GameData.ServerPlayerConnectionOk:
+            dataOk = True
+            print(data.message)
         if type(data) is GameData.ServerPlayerStartRequestAccepted:
             dataOk = True
             print("Ready: " + str(data.acceptedStartRequests) + "/"  + str(data.connectedPlayers) + " players")
-            data = s.recv(DATASIZE)
-            data = GameData.GameData.deserialize(data)
+            data = reader.read()
         if type(data) is GameData.ServerStartGameData:
             dataOk = True
             print("Game start!")
-            s.send(GameData.ClientPlayerReadyData(playerName).serialize())
+            framing.sendData(s, GameData.ClientPlayerReadyData(playerName))
             status = statuses[1]
         if type(data) is GameData.ServerGameStateData:
             dataOk = True
@@ -159,6 +177,8 @@ with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             print(data.scoreMessage)
             stdout.flush()
             #run = False
+            # The table goes back to the lobby: type "ready" to play again
+            status = statuses[0]
             print("Ready for a new game!")
         if not dataOk:
             print("Unknown or unimplemented data type: " +  str(type(data)))
@@ -1,4 +1,7 @@
 # Program constants / server constants
 HOST = "127.0.0.1"
 PORT =  1024 # 0x4A7AB1 could have been a better port, but networkers did not allow us to have it
-DATASIZE = int(10240 / 4)
\ No newline at end of file
+DATASIZE = int(10240 / 4) # bytes asked to the socket on every read
+HEADER_SIZE = 4 # bytes of the length prefix of every message
+PICKLE_CODEC = "pickle" # every message is pickled, understood by any client
+BINARY_CODEC = "binary" # struct-packed messages, see binarycodec.py
@@ -0,0 +1,72 @@
+import utils
+
+
+class TurnContext:
+    """
+    Quantities derived from the game state of the current turn, shared by all the rules of a policy.
+    Each one is computed the first time a rule asks for it, so rules repeating the same work get a lookup.
+    It must be built again after every game state refresh.
+    """
+
+    def __init__(self, client) -> None:
+        self.client = client
+        self.__stack_tops = None
+        self.__partners_playable_cards = None
+        # beliefs the slots probabilities were computed for
+        self.__slots_beliefs = None
+        self.__slots_playability = None
+        self.__slots_discardability = None
+
+    def stackTops(self):
+        """highest value on the table for every color, 0 for empty stacks"""
+        if self.__stack_tops is None:
+            table_cards = self.client.game_data["tableCards"]
+            self.__stack_tops = {
+                color: len(table_cards[color])
+                for color in table_cards
+            }
+        return self.__stack_tops
+
+    def isPlayable(self, color, value):
+        """checks if a card with the given color and value can be played right now"""
+        return value == self.stackTops()[color] + 1
+
+    def handSize(self):
+        """how many cards our hand holds: the belief slots past it hold no card"""
+        return self.client.game_data.get("handSize", len(self.client.knowledge))
+
+    def handKnowledge(self):
+        """knowledge of the slots holding a card, in hand order"""
+        return self.client.knowledge[:self.handSize()]
+
+    def __computeSlots(self):
+        """computes the probabilities of all our hand slots in one vectorized pass over their beliefs"""
+        beliefs = tuple(self.client.beliefs)
+        if beliefs != self.__slots_beliefs:
+            masks = utils.beliefMasks(beliefs)
+            self.__slots_playability, self.__slots_discardability = utils.calculatePlayabilityVector(
+                masks, self.client.unseen_cards,
+                self.client.game_data["tableCards"])
+            self.__slots_beliefs = beliefs
+
+    def slotsPlayability(self):
+        """playability of every slot of our hand, in hand order"""
+        self.__computeSlots()
+        return self.__slots_playability[:self.handSize()]
+
+    def slotsDiscardability(self):
+        """probability that every slot of our hand is not playable, in hand order"""
+        self.__computeSlots()
+        return self.__slots_discardability[:self.handSize()]
+
+    def partnersPlayableCards(self):
+        """(player, card) pairs of the playable cards in the other players' hands, in turn and hand order"""
+        if self.__partners_playable_cards is None:
+            self.__partners_playable_cards = []
+            for player in self.client.game_data["players"]:
+                if player.name == self.client.player_name:
+                    continue
+                for card in player.hand:
+                    if self.isPlayable(card.color, card.value):
+                        self.__partners_playable_cards.append((player, card))
+        return self.__partners_playable_cards
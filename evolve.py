@@ -1,16 +1,25 @@
 import math
+import os
+import random
 import rules
 import server
 import SmartClient
 import time
 import pickle
 import utils
+import headless
+import batch
+import botrunner
+import session
+import transport
 import numpy as np
 from SmartClient import SmartClient
-from multiprocessing import Process, Lock
+from cache import FitnessCache
+from multiprocessing import Process, Pool
 
-IP = "127.0.0.1"
-PORT = 1024
+SERVER_ADDRESS = "socketpair"  # Transport of the socket games (see transport.py): "socketpair", "unix://" or "tcp://127.0.0.1:0"
+CODEC = "binary"  # Messages of the socket path: "binary" (see binarycodec.py) or "pickle"
+SUBSCRIBE = True  # Clients get state deltas pushed by the server instead of asking for the state at every message
 NUM_PLAYERS = 2
 NUM_RULES = len(rules.DEFAULT_ORDER)
 POPULATION_SIZE = NUM_RULES // 2
@@ -20,23 +29,35 @@ STEADY_STATE = 5
 MUTATION_RATE = 0.75
 PERCENTAGE = 10
 EVOLVE_EXISTING_BEST_STRATEGY = True
-
-
-def playAGame(strategy):
+HEADLESS = True  # Play the games in-process instead of spawning server and clients
+COMMON_RANDOM_NUMBERS = True  # Evaluate every individual of a generation on the same seeded decks
+USE_FITNESS_CACHE = True  # Reuse the fitness of strategies already evaluated on the same decks, also across runs
+SEED_FILE = "outputs/base_seed"  # Base seed the decks of every generation derive from, kept so later runs play the same decks
+RACING = True  # Spend more games only on the children competing for selection, on the same decks every generation
+RACE_INITIAL_EPISODES = 1  # Games every child plays in the first round of a race
+RACE_ELIMINATION = 0.5  # Fraction of the children dropped after every round of a race
+RACE_MAX_EPISODES = 16  # Games after which a race is stopped anyway
+RACE_CONFIDENCE = 1.96  # Standard errors separating the selected children from the others
+WORKERS = os.cpu_count()  # Processes evaluating headless games in parallel, 1 to evaluate sequentially
+BATCH = False  # Play all the games of a generation in lockstep with the NumPy engine of batch.py (implies HEADLESS)
+PERSISTENT_SESSIONS = True  # Socket games are all played by the same clients and server, see session.py
+ASYNC_SEATS = False  # Play all the socket games of a generation at once, every seat in this process (see botrunner.py)
+
+
+def playAGame(strategy, seed=None):
     """plays one istance of a game match between players having all the same strategy and return the obtained score"""
-    server_process = Process(target=server.start_server, args=(NUM_PLAYERS, ))
-    server_process.start()
-    time.sleep(0.5)  #Otherwise the server crashes
-
-    lock = Lock()
+    server_process, addresses = server.launchServer(NUM_PLAYERS, seed, SERVER_ADDRESS)
 
     players = []  # Players processes list
     for i in range(0, NUM_PLAYERS):
-        player_process = Process(target=SmartClient(
-            f"SmartClient-{i}", IP, PORT, rules_order=strategy).start,
-                                 args=(lock, ))
+        client = SmartClient(f"SmartClient-{i}", addresses[i], None, rules_order=strategy, codec=CODEC,
+                             subscribe=SUBSCRIBE)
+        # The deck seed also seeds the random choices of the client (see Client.startRandom)
+        client.seed = seed
+        player_process = Process(target=client.start)
         players.append(player_process)
         players[i].start()
+    transport.release(addresses)
 
     for i in range(0, len(players)):
         players[i].join(TIMEOUT)
@@ -51,34 +72,72 @@ def playAGame(strategy):
         players.append(pickle.load(binary_file))
         binary_file.close()
 
-    # I ignore that server counts as zero-points games the ones that end with storm
-    # tokens. I count the points up until that point
-    score = 0
-    for player in players:
-        temp_score = 0
-        table_cards = player.game_data["tableCards"]
+    return utils.getScoreFromClients(players)
+
+
+socket_session = None
+
+
+def playSessionGame(strategy, seed=None):
+    """plays one game on the socket session, started by the first game"""
+    global socket_session
+    if socket_session is None:
+        socket_session = session.SocketSession(NUM_PLAYERS, CODEC, SUBSCRIBE, SERVER_ADDRESS)
+    return socket_session.play(strategy, seed)
 
-        for card_stack in table_cards:
-            temp_score += len(table_cards[card_stack])
 
-        # Sometimes player get different scores for some reason -> probably it has an outdated table
-        if temp_score > score:
-            score = temp_score
+def closeSession():
+    """stops the clients and server of the socket session, if any"""
+    global socket_session
+    if socket_session is not None:
+        socket_session.close()
+        socket_session = None
 
-        # print(f"{player.player_name}: {temp_score}")
 
-    # print(f"Game final score: {score}")
-    return score
+def playEpisode(strategy, seed=None):
+    """plays one game with the configured runner and returns its score"""
+    if HEADLESS:
+        return headless.playHeadlessGame(strategy, NUM_PLAYERS, seed, SUBSCRIBE)
+    if PERSISTENT_SESSIONS:
+        return playSessionGame(strategy, seed)
+    return playAGame(strategy, seed)
 
 
-def evaluateSolution(strategy_individual, number=None, population_length=None):
+def loadBaseSeed(path=SEED_FILE):
+    """reads the base seed of the deck seeds, drawing and saving a new one the first time"""
+    try:
+        with open(path, "r") as seed_file:
+            return int(seed_file.read())
+    except (OSError, ValueError):
+        base_seed = int(np.random.randint(0, 2**31))
+        with open(path, "w") as seed_file:
+            seed_file.write(str(base_seed))
+        return base_seed
+
+
+def generateSeeds(base_seed, generation, episodes=EPISODES):
+    """
+    the deck seeds of the games every individual of a generation is evaluated on:
+    the same for a generation in every run from the same base seed, so cached fitnesses are found again
+    """
+    rng = np.random.default_rng([base_seed, generation])
+    return [int(seed) for seed in rng.integers(0, 2**31, size=episodes)]
+
+
+def evaluateSolution(strategy_individual,
+                     number=None,
+                     population_length=None,
+                     seeds=None):
     """plays [EPISODES] games between players having the same strategy and returns the average obtained score"""
     total_scores = 0
     if number is not None and population_length is not None:
         print(f"Evaluating {strategy_individual}:")
 
+    if seeds is None:
+        seeds = [None] * EPISODES
+
     for ep in range(EPISODES):
-        total_scores += playAGame(strategy_individual)
+        total_scores += playEpisode(strategy_individual, seeds[ep])
         print(f"Episode: {ep}\n")
 
     avg_score = total_scores / EPISODES
@@ -89,6 +148,190 @@ def evaluateSolution(strategy_individual, number=None, population_length=None):
     return avg_score
 
 
+def initWorker():
+    """reseeds the random generators of a pool worker, otherwise every forked worker would play the same games"""
+    random.seed()
+    np.random.seed()
+
+
+def playsAllAtOnce():
+    """tells if all the games of a generation are played together instead of one by one"""
+    return BATCH or (ASYNC_SEATS and not HEADLESS)
+
+
+def playEpisodes(population, pool=None, seeds=None):
+    """plays a game on every seed for every individual of the population and returns the scores of each individual"""
+    if playsAllAtOnce():
+        strategies = [strategy for strategy in population for _ in seeds]
+        if BATCH:
+            scores = batch.playBatchGames(strategies, NUM_PLAYERS, list(seeds) * len(population)).tolist()
+        else:
+            scores = botrunner.playAsyncGames(strategies, NUM_PLAYERS, list(seeds) * len(population),
+                                              SERVER_ADDRESS, CODEC, SUBSCRIBE)
+        return [
+            scores[i * len(seeds):(i + 1) * len(seeds)]
+            for i in range(len(population))
+        ]
+
+    if pool is None:
+        return [[playEpisode(strategy, seed) for seed in seeds]
+                for strategy in population]
+
+    # Every (individual, episode) pair is a job, scores come back in submission order
+    jobs = [(strategy, seed) for strategy in population for seed in seeds]
+    chunksize = max(1, len(jobs) // (WORKERS * 4))
+    scores = pool.starmap(playEpisode, jobs, chunksize=chunksize)
+
+    return [
+        scores[i * len(seeds):(i + 1) * len(seeds)]
+        for i in range(len(population))
+    ]
+
+
+def playPopulation(population, pool=None, seeds=None):
+    """plays [EPISODES] games for every individual of the population and returns the fitness list in the same order"""
+    if pool is None and not playsAllAtOnce():
+        return [
+            evaluateSolution(population[i],
+                             number=i,
+                             population_length=len(population),
+                             seeds=seeds) for i in range(len(population))
+        ]
+
+    if seeds is None:
+        seeds = [None] * EPISODES
+
+    population_fitness = []
+    for i, scores in enumerate(playEpisodes(population, pool, seeds)):
+        population_fitness.append(sum(scores) / EPISODES)
+        print(f"Evaluated solution n° {i+1}/{len(population)}")
+
+    return population_fitness
+
+
+def evaluatePopulation(population, pool=None, seeds=None, fitness_cache=None):
+    """evaluates every individual of the population and returns the fitness list in the same order"""
+    # A fitness on random decks is a single noisy draw, it is never cached
+    if fitness_cache is None or seeds is None:
+        print(f"{len(population)} strategies played ({len(population) * EPISODES} games)")
+        return playPopulation(population, pool, seeds)
+
+    # Only strategies never evaluated on these decks are played, once each
+    keys = [
+        fitness_cache.key(strategy, EPISODES, seeds)
+        for strategy in population
+    ]
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in fitness_cache and key not in missing:
+            missing[key] = i
+
+    if len(missing) > 0:
+        new_fitness = playPopulation([population[i] for i in missing.values()],
+                                     pool, seeds)
+        for key, fitness in zip(missing.keys(), new_fitness):
+            fitness_cache.put(key, fitness)
+
+    print(
+        f"{len(missing)} strategies played ({len(missing) * EPISODES} games), {len(population) - len(missing)} taken from the fitness cache"
+    )
+    return [fitness_cache.get(key) for key in keys]
+
+
+def isSelectionSettled(scores, ranking, selected):
+    """checks if the [selected] best individuals of the ranking are better than the following one with confidence"""
+    if len(ranking) <= selected:
+        return True
+
+    def bounds(individual_scores):
+        mean = np.mean(individual_scores)
+        margin = RACE_CONFIDENCE * np.std(individual_scores, ddof=1) / math.sqrt(
+            len(individual_scores))
+        return mean - margin, mean + margin
+
+    worst_selected_lower, _ = bounds(scores[ranking[selected - 1]])
+    _, best_excluded_upper = bounds(scores[ranking[selected]])
+    return worst_selected_lower > best_excluded_upper
+
+
+def playRaceEpisodes(population, pool=None, seeds=None, fitness_cache=None):
+    """
+    plays a game on every seed for every individual of the population as playEpisodes,
+    taking the score of the games already played on a seed from the cache (as the fitness of one episode)
+    """
+    if fitness_cache is None or None in seeds:
+        return playEpisodes(population, pool, seeds), len(population) * len(seeds)
+
+    keys = [[fitness_cache.key(strategy, 1, [seed]) for seed in seeds]
+            for strategy in population]
+    games = 0
+    for j, seed in enumerate(seeds):
+        # Only strategies never played on this deck are played, once each
+        missing = {}
+        for i in range(len(population)):
+            if keys[i][j] not in fitness_cache and keys[i][j] not in missing:
+                missing[keys[i][j]] = i
+        if len(missing) == 0:
+            continue
+        new_scores = playEpisodes([population[i] for i in missing.values()], pool, [seed])
+        for key, individual_scores in zip(missing.keys(), new_scores):
+            fitness_cache.put(key, individual_scores[0])
+        games += len(missing)
+    return [[fitness_cache.get(key) for key in individual_keys] for individual_keys in keys], games
+
+
+def raceOffspring(offspring, pool=None, base_seed=None, fitness_cache=None):
+    """
+    evaluates the offspring racing it: every child plays a few games, the worst ones are dropped
+    and the survivors play more and more games until the top PERCENTAGE% is settled.
+    returns the fitness and the number of games played of every child, and the final ranking of the survivors
+    """
+    selected = math.ceil(len(offspring) * (PERCENTAGE / 100))
+    if COMMON_RANDOM_NUMBERS:
+        # The same decks every generation: children equal to a parent, or to any strategy raced before, cost no games
+        seeds = generateSeeds(base_seed, 0, RACE_MAX_EPISODES)
+    else:
+        seeds = [None] * RACE_MAX_EPISODES
+
+    scores = [[] for _ in range(len(offspring))]
+    alive = list(range(len(offspring)))
+    played = 0
+    games = 0
+    new_episodes = RACE_INITIAL_EPISODES
+    while True:
+        # Survivors all play the same next seeds
+        round_seeds = seeds[played:played + new_episodes]
+        round_scores, round_games = playRaceEpisodes([offspring[i] for i in alive], pool,
+                                                     round_seeds, fitness_cache)
+        for i, individual_scores in zip(alive, round_scores):
+            scores[i].extend(individual_scores)
+        played += len(round_seeds)
+        games += round_games
+        print(f"Race: {len(alive)} children played {played} games")
+
+        alive.sort(key=lambda i: np.mean(scores[i]), reverse=True)
+        if played >= RACE_MAX_EPISODES:
+            break
+        # Children still in the race always get at least [EPISODES] games
+        if played >= EPISODES and isSelectionSettled(scores, alive, selected):
+            break
+
+        # Drop the bottom fraction, survivors double their games
+        keep = max(selected,
+                   math.ceil(len(alive) * (1 - RACE_ELIMINATION)))
+        alive = alive[:keep]
+        # Only the children to select are left: more games would not change the selection
+        if len(alive) <= selected and played >= EPISODES:
+            break
+        new_episodes = min(played, RACE_MAX_EPISODES - played)
+
+    offspring_fitness = [float(np.mean(s)) for s in scores]
+    offspring_episodes = [len(s) for s in scores]
+    print(f"Race: {games} games played, {sum(offspring_episodes) - games} taken from the fitness cache, "
+          f"{len(offspring) * EPISODES} with {EPISODES} games per child")
+    return offspring_fitness, offspring_episodes, alive
+
+
 def swapMutation(parent, mutation_rate=MUTATION_RATE):
     """generates a child solution by applying a swapping mutation to its parent"""
     child = parent.copy()
@@ -103,6 +346,18 @@ def swapMutation(parent, mutation_rate=MUTATION_RATE):
     return child
 
 
+def removeEquivalentIndividuals(population):
+    """keeps only the first individual of every group of rule orders that play the same way (see rules.canonicalOrder)"""
+    seen = set()
+    unique = []
+    for i, strategy in enumerate(population):
+        canonical = rules.canonicalOrder(strategy)
+        if canonical not in seen:
+            seen.add(canonical)
+            unique.append(i)
+    return population[unique]
+
+
 def getTopPercent(population, population_fitness):
     """selects the top PERCENTAGE% individuals with the best fitness in the population"""
     x = math.ceil(len(population) * (PERCENTAGE / 100))
@@ -139,6 +394,15 @@ def evolve():
         global_best_solution = utils.loadStrategyFromFile()
         global_best_fitness = utils.loadScoreFromFile()
 
+    # Races cache the score of every game, a plain evaluation the fitness over EPISODES games
+    fitness_cache = FitnessCache().load() if USE_FITNESS_CACHE else None
+    base_seed = loadBaseSeed() if COMMON_RANDOM_NUMBERS else None
+
+    # Parallel evaluation is only possible headless: pool workers cannot start the server and client processes
+    pool = None
+    if HEADLESS and WORKERS > 1 and not BATCH:
+        pool = Pool(WORKERS, initializer=initWorker)
+
     # Evolution loop
     while steady_state < STEADY_STATE:
         steady_state += 1
@@ -153,17 +417,25 @@ def evolve():
                     swapMutation(parent,
                                  mutation_rate=(MUTATION_RATE / generations)))
 
-        offspring = np.array(offspring)
+        offspring = removeEquivalentIndividuals(np.array(offspring))
 
         # New offspring is evaluated and new parents are selected
         print("OFFSPRING EVALUTATION...")
-        offspring_fitness = []
-        for i in range(len(offspring)):
-            child_fitness = evaluateSolution(offspring[i],
-                                             number=i,
-                                             population_length=len(offspring))
-            offspring_fitness.append(child_fitness)
-
+        if RACING:
+            offspring_fitness, offspring_episodes, ranking = raceOffspring(
+                offspring, pool, base_seed, fitness_cache)
+        else:
+            # Common random numbers: every child plays the same decks, so fitness differences come from the strategies
+            seeds = generateSeeds(base_seed, generations) if COMMON_RANDOM_NUMBERS else None
+            offspring_fitness = evaluatePopulation(offspring, pool, seeds,
+                                                   fitness_cache)
+            offspring_episodes = [EPISODES] * len(offspring)
+        if fitness_cache is not None:
+            fitness_cache.save()
+        for i, child_fitness in enumerate(offspring_fitness):
+            # Children dropped early by the race played too few games to be trusted
+            if offspring_episodes[i] < EPISODES:
+                continue
             if child_fitness > global_best_fitness:
                 global_best_fitness = child_fitness
                 global_best_solution = offspring[i]
@@ -175,7 +447,11 @@ def evolve():
 
         # Parent Selection -> Pick the top 10% individuals
         print("OFFSPRING SELECTION...")
-        population = getTopPercent(offspring, offspring_fitness)
+        if RACING:
+            # Children dropped by the race are out even if a few lucky games gave them a higher mean
+            population = offspring[ranking[:math.ceil(len(offspring) * (PERCENTAGE / 100))]]
+        else:
+            population = getTopPercent(offspring, offspring_fitness)
 
         print(
             f"\n\n\n\n\n\nGeneration n° {generations} - Global best: {global_best_fitness}"
@@ -186,6 +462,11 @@ def evolve():
         if generations == 100:
             break
 
+    if pool is not None:
+        pool.close()
+        pool.join()
+    closeSession()
+
     return global_best_solution, global_best_fitness
 
 
@@ -0,0 +1,76 @@
+import asyncio
+import GameData
+import binarycodec
+from constants import DATASIZE, HEADER_SIZE, PICKLE_CODEC, BINARY_CODEC
+
+
+class FrameReader:
+    """
+    Splits the byte stream of a socket into the length-prefixed frames of GameData.serialize.
+    A recv may return part of a frame or several frames at once: bytes are buffered
+    until a whole frame is available, and the ones after it are kept for the next read.
+    Frames may be pickled or binary (see binarycodec.py), codec is the one of the last frame read.
+    """
+
+    def __init__(self, _socket, bufsize=DATASIZE) -> None:
+        self.socket = _socket
+        self.bufsize = bufsize
+        self.buffer = bytearray()
+        self.codec = PICKLE_CODEC
+
+    def readFrame(self):
+        """returns the next whole frame (length prefix included), None once the connection is closed"""
+        while True:
+            if len(self.buffer) >= HEADER_SIZE:
+                size = HEADER_SIZE + int.from_bytes(self.buffer[:HEADER_SIZE], 'little')
+                if len(self.buffer) >= size:
+                    frame = bytes(self.buffer[:size])
+                    del self.buffer[:size]
+                    return frame
+            chunk = self.socket.recv(self.bufsize)
+            if not chunk:
+                return None
+            self.buffer += chunk
+
+    def read(self):
+        """returns the next message, None once the connection is closed"""
+        frame = self.readFrame()
+        if frame is None:
+            return None
+        self.codec = frameCodec(frame)
+        return decodeFrame(frame)
+
+
+async def readFrameAsync(stream: asyncio.StreamReader):
+    """asyncio counterpart of FrameReader.readFrame, the stream does the buffering"""
+    try:
+        header = await stream.readexactly(HEADER_SIZE)
+        payload = await stream.readexactly(int.from_bytes(header, 'little'))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return header + payload
+
+
+def encodeFrame(data: GameData.GameData, codec=PICKLE_CODEC) -> bytes:
+    """builds the frame of a message with the given codec"""
+    if codec == BINARY_CODEC:
+        payload = binarycodec.encode(data)
+        return len(payload).to_bytes(HEADER_SIZE, 'little') + payload
+    return data.serialize()
+
+
+def frameCodec(frame: bytes):
+    """tells the codec a frame was built with"""
+    return BINARY_CODEC if binarycodec.isBinary(frame[HEADER_SIZE:]) else PICKLE_CODEC
+
+
+def decodeFrame(frame: bytes) -> GameData.GameData:
+    """rebuilds the message of a frame, whatever its codec"""
+    if frameCodec(frame) == BINARY_CODEC:
+        return binarycodec.decode(frame[HEADER_SIZE:])
+    return GameData.GameData.deserialize(frame)
+
+
+def sendData(_socket, data: GameData.GameData, codec=PICKLE_CODEC):
+    """sends a whole message, send alone may write only part of it"""
+    _socket.sendall(encodeFrame(data, codec))
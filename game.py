@@ -1,10 +1,23 @@
-from copy import deepcopy
-from random import shuffle
+from random import Random, shuffle
 import GameData
 import logging
 
 
+# Cards are small ints inside the engine: the id of the card, its index in DECK.
+# Rules work on card codes instead, the same for every copy: code = color index * 5 + value - 1
+COLORS = ["red", "yellow", "green", "blue", "white"]
+NUM_VALUES = 5
+COPIES = [3, 2, 2, 2, 1]  # copies of each value in the deck, for every color
+COLOR_INDEX = {color: i for i, color in enumerate(COLORS)}
+
+
+def cardCode(color, value):
+    return COLOR_INDEX[color] * NUM_VALUES + value - 1
+
+
 class Card(object):
+    __slots__ = ("id", "value", "color")
+
     def __init__(self, id, value, color) -> None:
         super().__init__()
         self.id = id
@@ -26,7 +39,20 @@ class Card(object):
         return self.id == other.id
 
 
+# The codes of the 50 cards of the deck before shuffling (all the ones, then the twos...), by card id
+DECK = [cardCode(color, value)
+        for value in range(1, NUM_VALUES + 1)
+        for _ in range(COPIES[value - 1])
+        for color in COLORS]
+
+# Flyweight table: the Card object of every card id, shared by every game. Every copy keeps an id of its own,
+# so two copies of a card are different cards
+CARDS = [Card(id, code % NUM_VALUES + 1, COLORS[code // NUM_VALUES]) for id, code in enumerate(DECK)]
+
+
 class Token(object):
+    __slots__ = ("type", "flipped")
+
     def __init__(self, type) -> None:
         super().__init__()
         self.type = type
@@ -37,6 +63,9 @@ class Token(object):
 
 
 class Player(object):
+    # Inside the engine the hand holds card ids, players sent to clients hold Card objects
+    __slots__ = ("name", "ready", "hand")
+
     def __init__(self, name) -> None:
         super().__init__()
         self.name = name
@@ -63,8 +92,6 @@ class Player(object):
 
 class Game(object):
 
-    __dataActions = {}
-
     __scoreMessages = [
         "Booooooooooooring!",
         "Meh!",
@@ -73,81 +100,20 @@ class Game(object):
         "AMAZING!",
         "YOU'RE THE BEST!"
     ]
-    __cards = []  # cards are the same for everyone
     __MAX_NOTE_TOKENS = 8
     __MAX_STORM_TOKENS = 3
     __MAX_FIREWORKS = 5
 
-    def __init__(self) -> None:
+    def __init__(self, seed=None) -> None:
         super().__init__()
+        # seed of the deck shuffle, None to shuffle with the global random generator
+        self.__seed = seed
         self.__discardPile = []
         # Init cards
         self.__gameOver = False
-        if len(self.__cards) == 0:
-            numCards = 0
-            for _ in range(3):
-                self.__cards.append(Card(numCards, 1, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 2, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 3, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 4, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "white"))
-                numCards += 1
-            for _ in range(1):
-                self.__cards.append(Card(numCards, 5, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "white"))
-                numCards += 1
-        self.__cardsToDraw = deepcopy(self.__cards)
-        self.__tableCards = {
-            "red": [],
-            "yellow": [],
-            "green": [],
-            "blue": [],
-            "white": []
-        }
+        self.__cardsToDraw = list(range(len(DECK)))
+        # The ids of the cards on the stack of every color, from the one up
+        self.__tableCards = [[] for _ in COLORS]
 
         ###
         # Init tokens
@@ -166,7 +132,11 @@ class Game(object):
 
         # score
         self.__score = 0
+        # (player, hand index, drawn card, played card, discarded card) of the last move, see getStateDelta
+        self.__lastMove = None
         # add actions for each class of data
+        # ! BUGFIX this used to be a class attribute, so every game dispatched to the last created one
+        self.__dataActions = {}
         self.__dataActions[GameData.ClientPlayerDiscardCardRequest] = self.__satisfyDiscardRequest
         self.__dataActions[GameData.ClientGetGameStateRequest] = self.__satisfyShowCardRequest
         self.__dataActions[GameData.ClientPlayerPlayCardRequest] = self.__satisfyPlayCardRequest
@@ -204,13 +174,14 @@ class Game(object):
         if player.name == data.sender:
             if data.handCardOrdered >= len(player.hand) or data.handCardOrdered < 0:
                 return (GameData.ServerActionInvalid("You don't have that many cards!"), None)
-            card: Card = player.hand[data.handCardOrdered]
-            if not self.__discardCard(card.id, player.name):
+            card: Card = CARDS[player.hand[data.handCardOrdered]]
+            if not self.__discardCard(data.handCardOrdered, player.name):
                 logging.warning(
                     "Impossible discarding a card: there is no used token available")
                 return (GameData.ServerActionInvalid("You have no used tokens"), None)
             else:
-                self.__drawCard(player.name)
+                drawn = self.__drawCard(player.name)
+                self.__lastMove = (player.name, data.handCardOrdered, drawn, None, card.id)
                 #logging.info("Player: " + self.__getCurrentPlayer().name +
                 #             ": card " + str(card.id) + " discarded successfully")
                 self.__nextTurn()
@@ -223,7 +194,7 @@ class Game(object):
     def __satisfyShowCardRequest(self, data: GameData.ClientGetGameStateRequest):
         #logging.info("Showing hand to: " + data.sender)
         currentPlayer, playerList, playerHandSize = self.__getPlayersStatus(data.sender)
-        return (GameData.ServerGameStateData(currentPlayer, playerHandSize, playerList, self.__noteTokens, self.__stormTokens, self.__tableCards, self.__discardPile), None)
+        return (GameData.ServerGameStateData(currentPlayer, playerHandSize, playerList, self.__noteTokens, self.__stormTokens, self.__getTableCards(), [CARDS[c] for c in self.__discardPile]), None)
 
     # Play card request
 
@@ -233,9 +204,8 @@ class Game(object):
         if p.name == data.sender:
             if data.handCardOrdered >= len(p.hand) or data.handCardOrdered < 0:
                 return (GameData.ServerActionInvalid("You don't have that many cards!"), None)
-            card: Card = p.hand[data.handCardOrdered]
-            self.__playCard(p.name, data.handCardOrdered)
-            ok = self.__checkTableCards()
+            card: Card = CARDS[p.hand[data.handCardOrdered]]
+            ok = self.__playCard(p.name, data.handCardOrdered)
             if not ok:
                 self.__nextTurn()
                 # ! ADDED last param. see GameData relative comment of GameData.ServerPlayerThunderStrike
@@ -275,10 +245,10 @@ class Game(object):
 
         for i in range(len(destPlayer.hand)):
             if data.type == "color" or data.type == "colour":
-                if data.value == destPlayer.hand[i].color:
+                if data.value == CARDS[destPlayer.hand[i]].color:
                     positions.append(i)
             elif data.type == "value":
-                if data.value == destPlayer.hand[i].value:
+                if data.value == CARDS[destPlayer.hand[i]].value:
                     positions.append(i)
             else:
                 # Backtrack on note token
@@ -290,6 +260,7 @@ class Game(object):
 
         if len(positions) == 0:
             return GameData.ServerInvalidDataReceived(data="You cannot give hints about cards that the other person does not have"), None
+        self.__lastMove = None
         self.__nextTurn()
         self.__noteTokens += 1
         #logging.info("Player " + data.sender + " providing hint to " + data.destination +
@@ -297,9 +268,50 @@ class Game(object):
         # ! ADDED last param. see GameData relative comment
         return None, GameData.ServerHintData(data.sender, data.destination, data.type, data.value, positions, self.__getCurrentPlayer().name)
 
+    def getStateDelta(self, playerName: str):
+        """what changed in the state seen by a player with the last move, instead of a whole show response"""
+        handChanges = {}
+        playedCards = []
+        discardedCards = []
+        if self.__lastMove is not None:
+            name, index, drawn, played, discarded = self.__lastMove
+            # ! we don't want to cheat: the player does not see the card it draws
+            drawnCard = CARDS[drawn] if drawn is not None and name != playerName else None
+            handChanges[name] = (index, drawnCard)
+            if played is not None:
+                playedCards.append(CARDS[played])
+            if discarded is not None:
+                discardedCards.append(CARDS[discarded])
+        handSize = len(self.__getPlayer(playerName).hand)
+        return GameData.ServerGameStateDelta(self.__getCurrentPlayer().name, handSize, handChanges, playedCards, discardedCards, self.__noteTokens, self.__stormTokens)
+
     def isGameOver(self):
         return self.__gameOver
 
+    # Snapshots for lookahead search: taking and restoring one only copies a few short tuples
+
+    def snapshot(self):
+        """
+        the state of the game as a flat tuple of immutable values: deck, discard pile, stacks and hands as card ids,
+        then tokens, turn and end of game. The seated players are not part of it, restore it on the same table
+        """
+        return (tuple(self.__cardsToDraw), tuple(self.__discardPile), tuple(tuple(stack) for stack in self.__tableCards),
+                tuple(tuple(p.hand) for p in self.__players), self.__noteTokens, self.__stormTokens,
+                self.__currentPlayer, self.__started, self.__lastTurn, self.__lastMoves,
+                self.__gameOver, self.__score, self.__lastMove)
+
+    def restore(self, snapshot):
+        """puts the game back in the state of a snapshot taken on it, it can be restored any number of times"""
+        (cardsToDraw, discardPile, tableCards, hands, self.__noteTokens, self.__stormTokens,
+         self.__currentPlayer, self.__started, self.__lastTurn, self.__lastMoves,
+         self.__gameOver, self.__score, self.__lastMove) = snapshot
+        self.__cardsToDraw[:] = cardsToDraw
+        self.__discardPile[:] = discardPile
+        for stack, cards in zip(self.__tableCards, tableCards):
+            stack[:] = cards
+        for p, hand in zip(self.__players, hands):
+            p.hand[:] = hand
+
     # Player functions
     # players list. Not the best, but there are literally max 5 players and the list should give us the order of connection = the order of the rounds
     def addPlayer(self, name: str):
@@ -317,6 +329,10 @@ class Game(object):
                 p.ready = True
                 break
 
+    def setSeed(self, seed):
+        """sets the seed of the deck shuffle, before the game starts"""
+        self.__seed = seed
+
     def getNumReadyPlayers(self) -> int:
         count = 0
         for p in self.__players:
@@ -330,7 +346,10 @@ class Game(object):
 
     def start(self):
         self.__lastMoves = len(self.__players) + 1
-        shuffle(self.__cardsToDraw)
+        if self.__seed is None:
+            shuffle(self.__cardsToDraw)
+        else:
+            Random(self.__seed).shuffle(self.__cardsToDraw)
         if len(self.__players) < 2:
             logging.warning("Not enough players!")
             return
@@ -356,7 +375,11 @@ class Game(object):
                 players.append(tmp_player)
                 handSize = len(p.hand)
             else:
-                players.append(p)
+                # the others are shown with their cards, as Card objects
+                shown_player = Player(p.name)
+                shown_player.ready = p.ready
+                shown_player.hand = [CARDS[c] for c in p.hand]
+                players.append(shown_player)
         return (self.__players[self.__currentPlayer].name, players, handSize)
 
     def __getPlayer(self, currentPlayerName: str) -> Player:
@@ -367,73 +390,67 @@ class Game(object):
     def __getCurrentPlayer(self) -> Player:
         return self.__players[self.__currentPlayer]
 
-    def __discardCard(self, cardID: int, playerName: str) -> bool:
+    def __discardCard(self, cardPosition: int, playerName: str) -> bool:
         if self.__noteTokens < 1:  # Ok only if you already used at least 1 token
             return False
         self.__noteTokens -= 1
-        endLoop = False
-        # find player
-        for p in self.__players:
-            if endLoop:
-                break
-            if p.name == playerName:
-                # find card
-                for card in p.hand:
-                    if endLoop:
-                        break
-                    if card.id == cardID:
-                        self.__discardPile.append(card)  # discard
-                        p.hand.remove(card)  # remove from hand
-                        endLoop = True
+        p = self.__getPlayer(playerName)
+        self.__discardPile.append(p.hand.pop(cardPosition))  # remove from hand and discard
         return True
 
+    # Returns the drawn card, None if the deck is empty
     def __drawCard(self, playerName: str):
         if len(self.__cardsToDraw) == 0:
-            return
+            return None
         card = self.__cardsToDraw.pop()
         for p in self.__players:
             if p.name == playerName:
                 p.hand.append(card)
+        return card
 
-    def __playCard(self, playerName: str, cardPosition: int):
+    # Returns False if the card could not be put on its stack: it is discarded and a storm token is used
+    def __playCard(self, playerName: str, cardPosition: int) -> bool:
         p = self.__getPlayer(playerName)
-        self.__tableCards[p.hand[cardPosition].color].append(
-            p.hand[cardPosition])
-        p.hand.pop(cardPosition)
+        card = p.hand.pop(cardPosition)
+        drawn = None
         if len(self.__cardsToDraw) > 0:
-            p.hand.append(self.__cardsToDraw.pop())
-
-    def __checkTableCards(self) -> bool:
-        for cardPool in self.__tableCards:
-            if len(self.__tableCards[cardPool]) > 0 and self.__tableCards[cardPool][len(self.__tableCards[cardPool]) - 1].value != len(self.__tableCards[cardPool]):
-                card = self.__tableCards[cardPool].pop()
-                self.__discardPile.append(card)
-                self.__strikeThunder()
-                return False
+            drawn = self.__cardsToDraw.pop()
+            p.hand.append(drawn)
+        color = DECK[card] // NUM_VALUES
+        if len(self.__tableCards[color]) != DECK[card] % NUM_VALUES:
+            self.__lastMove = (playerName, cardPosition, drawn, None, card)
+            self.__discardPile.append(card)
+            self.__strikeThunder()
+            return False
+        self.__lastMove = (playerName, cardPosition, drawn, card, None)
+        self.__tableCards[color].append(card)
         return True
 
-    # assumes cards checked
-    def __checkFinishedFirework(self, pile) -> bool:
-        return len(pile) == 5
+    # Stacks as sent to clients: the Card objects played on every color
+    def __getTableCards(self):
+        tableCards = {}
+        for color in range(len(COLORS)):
+            tableCards[COLORS[color]] = [CARDS[c] for c in self.__tableCards[color]]
+        return tableCards
+
+    def __checkFinishedFirework(self, top) -> bool:
+        return top == self.__MAX_FIREWORKS
 
     def __strikeThunder(self):
         self.__stormTokens += 1
 
     def __checkGameEnded(self):
         ended = True
-        for pile in self.__tableCards:
-            ended = ended and self.__checkFinishedFirework(pile)
+        # ! BUGFIX piles used to be iterated by color name, so completing every firework never ended the game
+        for stack in self.__tableCards:
+            ended = ended and self.__checkFinishedFirework(len(stack))
         if ended:
             return True, 25
         if self.__stormTokens == self.__MAX_STORM_TOKENS:
             return True, 0
         ended = self.__lastTurn and self.__lastMoves == 0
         if ended:
-            score = 0
-            for pile in self.__tableCards:
-                # ! BUGFIX # instead of 'len(pile)' --> 'pile' is the key (eg. 'red')
-                score += len(self.__tableCards[pile])
-            return True, score
+            return True, sum(len(stack) for stack in self.__tableCards)
         return False, 0
 
     def getPlayers(self):
@@ -455,10 +472,4 @@ class Game(object):
         print("White: "  + self.getMaxCardColor("white"))
 
     def getMaxCardColor(self, color):
-        cards = self.__tableCards[color]
-        c_max = 0
-        for c in cards:
-            if c.value > c_max:
-                c_max = c.value
-        
-        return str(c_max)
+        return str(len(self.__tableCards[COLOR_INDEX[color]]))
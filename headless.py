@@ -0,0 +1,126 @@
+import GameData
+import rules
+import utils
+from game import Game
+from SmartClient import SmartClient
+from context import TurnContext
+
+NUM_PLAYERS = 2
+
+
+class HeadlessTable:
+    """
+    Runs a whole game inside the current process: the server side is a plain game.Game
+    and every seat is a SmartClient that never opens a socket.
+    Messages are routed in the same order SmartClient.start would see them over the network,
+    so a game played here makes the same moves (and gets the same score) as the socket path.
+    With subscribe, clients keep their state up to date with the deltas the server pushes
+    (see GameData.ServerGameStateDelta) instead of asking for it.
+    """
+
+    def __init__(self, strategy, num_players=NUM_PLAYERS, seed=None, subscribe=False) -> None:
+        self.seed = seed
+        self.subscribe = subscribe
+        self.game = Game(seed)
+        self.clients = []
+        for i in range(0, num_players):
+            name = f"SmartClient-{i}"
+            client = SmartClient(name, None, None, rules_order=strategy, subscribe=subscribe)
+            # Seeds the random choices of the client at the game start, as over the network (see Client.startRandom)
+            client.seed = seed
+            self.clients.append(client)
+            self.game.addPlayer(name)
+            self.game.setPlayerReady(name)
+        self.policy = rules.getRulesInOrder(strategy)
+
+    def show(self, client):
+        """answers the 'show' request a client sends when its turn comes"""
+        request = GameData.ClientGetGameStateRequest(client.player_name)
+        data, _ = self.game.satisfyRequest(request, client.player_name)
+        client.processData(data)
+
+    def start(self):
+        """skips the lobby: every client receives the game start message and its first game state"""
+        names = [client.player_name for client in self.clients]
+        start_data = GameData.ServerStartGameData(names)
+        for client in self.clients:
+            client.ready = True
+            client.processData(start_data)
+        self.game.start()
+        for client in self.clients:
+            self.show(client)
+
+    def playTurn(self):
+        """lets the current player pick its move with its policy, returns False once the game cannot go on"""
+        player = next((c for c in self.clients if c.isMyTurn()), None)
+        if player is None:
+            return False
+        if not self.subscribe:
+            self.show(player)
+        multipleData = playBotTurn(player, self.game, self.policy)
+        if multipleData is None:
+            return False
+        self.broadcast(player, multipleData)
+        return not self.game.isGameOver()
+
+    def broadcast(self, player, data):
+        """delivers the result of a move to every player, as the server does"""
+        if type(data) is GameData.ServerGameOver:
+            # Clients would only dump their results to file
+            return
+        player.processData(data)
+        player.receiveHint(data)
+        if self.subscribe:
+            for client in self.clients:
+                if client is not player:
+                    client.processData(data)
+                    client.receiveHint(data)
+                client.processData(self.game.getStateDelta(client.player_name))
+            return
+        for client in self.clients:
+            if client is player:
+                continue
+            client.processData(data)
+            client.receiveHint(data)
+
+    def play(self):
+        """plays the game until the end and returns the score"""
+        self.start()
+        while self.playTurn():
+            pass
+        return utils.getScoreFromClients(self.clients)
+
+
+def playBotTurn(client, game, policy):
+    """
+    lets a seat without socket pick its move with its policy and plays it straight on the game.
+    returns the result of the move to broadcast, None if the seat cannot move
+    """
+    context = TurnContext(client)
+    for rule in policy:
+        move, err = rule(client, context)
+        if err:
+            continue
+        request = client.buildRequest(move) if move is not None else None
+        if request is None:
+            # Over the network the player would wait forever for an answer
+            return None
+        singleData, multipleData = game.satisfyRequest(request, client.player_name)
+        if multipleData is not None:
+            return multipleData
+        _, invalid_action = client.processData(singleData)
+        if not invalid_action:
+            # A valid answer that is not a broadcast ("show") does not end the turn
+            return None
+
+    # No rule produced a valid move
+    return None
+
+
+def playHeadlessGame(strategy, num_players=NUM_PLAYERS, seed=None, subscribe=False):
+    """plays one istance of a game in-process between players having all the same strategy and return the obtained score"""
+    return HeadlessTable(strategy, num_players, seed, subscribe).play()
+
+
+if __name__ == "__main__":
+    print(playHeadlessGame(rules.DEFAULT_ORDER))
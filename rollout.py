@@ -0,0 +1,182 @@
+import time
+import numpy as np
+import batch
+import rules
+import utils
+from game import COLORS
+
+# Seconds a rollout rule thinks before choosing its move: a round of simulated games cut short by it only counts if no round ended
+BUDGET = 0.1
+# Games simulated at once, every candidate move is played on the same samples of our hand
+ROUND_GAMES = 256
+# Rule order of every seat in the simulated games, None for rules.DEFAULT_ORDER
+ROLLOUT_ORDER = None
+
+
+def observedPosition(client):
+    """
+    the game as the client sees it, as batch arrays: the hands of the others (ours empty),
+    the table tops, the discarded cards counts and the index of the client in the turn order
+    """
+    names = client.game_data["player_names"]
+    hands = np.full((len(names), batch.KNOWLEDGE_SLOTS), -1)
+    sizes = np.zeros(len(names), dtype=int)
+    for player in client.game_data["players"]:
+        index = names.index(player.name)
+        codes = [utils.cardIndex(card.color, card.value) for card in player.hand]
+        hands[index, :len(codes)] = codes
+        sizes[index] = len(codes)
+    me = names.index(client.player_name)
+    sizes[me] = client.game_data["handSize"]
+
+    table_cards = client.game_data["tableCards"]
+    tops = np.array([len(table_cards[color]) for color in COLORS])
+    discarded = np.zeros(batch.NUM_CODES, dtype=int)
+    for card in client.game_data["discardPile"]:
+        discarded[utils.cardIndex(card.color, card.value)] += 1
+    return hands, sizes, tops, discarded, me
+
+
+def candidateMoves(hands, me, hand_size, note_tokens):
+    """the legal moves of the client as (kind, slot, dest, hint type, hint value), see batch.Moves"""
+    candidates = [(batch.PLAY, slot, 0, 0, 0) for slot in range(hand_size)]
+    if note_tokens > 0:
+        candidates += [(batch.DISCARD, slot, 0, 0, 0) for slot in range(hand_size)]
+    if note_tokens < 8:
+        for dest, hand in enumerate(hands):
+            cards = hand[hand >= 0]
+            if dest == me or len(cards) == 0:
+                continue
+            candidates += [(batch.HINT, 0, dest, batch.COLOR_HINT, color) for color in np.unique(batch.COLOR_OF[cards])]
+            candidates += [(batch.HINT, 0, dest, batch.VALUE_HINT, value) for value in np.unique(batch.VALUE_OF[cards])]
+    return candidates
+
+
+def sampleHands(rng, unseen, masks, hand_size, samples):
+    """
+    draws [samples] hands of ours, each card among the unseen ones its slot belief allows,
+    and returns them with the unseen cards left (the deck), None if the unseen cards cannot fill the hand
+    """
+    left = np.tile(unseen, (samples, 1))
+    hands = np.full((samples, batch.KNOWLEDGE_SLOTS), -1)
+    rows = np.arange(samples)
+    for slot in range(hand_size):
+        weights = left * masks[slot]
+        # A belief no unseen card fits any longer falls back to any unseen card
+        empty = weights.sum(axis=1) == 0
+        weights[empty] = left[empty]
+        cumulative = weights.cumsum(axis=1)
+        if (cumulative[:, -1] == 0).any():
+            return None
+        cards = (rng.random(samples) * cumulative[:, -1])[:, None] < cumulative
+        hands[:, slot] = cards.argmax(axis=1)
+        left[rows, hands[:, slot]] -= 1
+    return hands, left
+
+
+def shuffledDecks(rng, left):
+    """decks (one per sample, as batch.BatchGame takes them) holding the left cards of every sample in random order, drawn from the end"""
+    decks = np.full((len(left), len(batch.DECK)), -1)
+    for sample, counts in enumerate(left):
+        cards = rng.permutation(np.repeat(np.arange(batch.NUM_CODES), counts))
+        decks[sample, :len(cards)] = cards
+    return decks
+
+
+def playRound(client, rng, position, candidates, deadline):
+    """
+    plays every candidate move on the same samples of our hand, returns the mean score of each one
+    and whether all the games ended before the deadline (the others are scored by their table)
+    """
+    hands, sizes, tops, discarded, me = position
+    hand_size = sizes[me]
+    samples = max(1, ROUND_GAMES // len(candidates))
+    sampled = sampleHands(rng, np.asarray(client.unseen_cards), utils.beliefMasks(client.beliefs), hand_size, samples)
+    if sampled is None:
+        return None
+    own_hands, left = sampled
+    deck_size = left[0].sum()
+    num_players = len(hands)
+
+    # Game g plays candidate g // samples on sample g % samples
+    n = samples * len(candidates)
+    order = rules.DEFAULT_ORDER if ROLLOUT_ORDER is None else ROLLOUT_ORDER
+    game = batch.BatchGame([order] * n, num_players, rng=rng, decks=np.tile(shuffledDecks(rng, left), (len(candidates), 1)))
+    game.hands[:] = hands
+    game.hands[:, me] = np.tile(own_hands, (len(candidates), 1))
+    game.hand_sizes[:] = sizes
+    game.deck_left[:] = deck_size
+    game.tops[:] = tops
+    game.discarded[:] = discarded
+    game.note_tokens[:] = client.game_data["usedNoteTokens"]
+    game.storm_tokens[:] = client.game_data["usedStormTokens"]
+    game.current[:] = me
+    # How many moves are left once the deck is empty is not known: about one per player
+    game.last_turn[:] = deck_size == 0
+    game.last_moves[:] = num_players + 1 if deck_size > 0 else num_players
+    # Our own knowledge, the others' is unknown to us
+    game.beliefs[:, me] = utils.beliefMasks(client.beliefs)
+    game.last_updates[:, me] = np.argsort(np.argsort(
+        [card_dict["last_update"] for card_dict in client.knowledge], kind="stable"), kind="stable")
+    game.clock[:] = batch.KNOWLEDGE_SLOTS
+    game.last_hinted[:, me] = -1 if client.last_hinted_card is None else client.last_hinted_card
+
+    moves = batch.Moves(n)
+    chosen = np.repeat(np.array(candidates), samples, axis=0)
+    moves.send[:] = True
+    moves.kind, moves.slot, moves.dest, moves.hint_type, moves.hint_value = chosen.T
+    game.applyMoves(np.arange(n), game.current.copy(), moves, game.tops.sum(axis=1))
+    while time.perf_counter() < deadline and game.step():
+        pass
+
+    # Scored as evolve scores games (see utils.getScoreFromClients): a game lost to the storm tokens keeps its table,
+    # the server would give it nothing and nearly every game of the default order ends that way
+    scores = np.where(game.over, game.scores, game.tops.sum(axis=1))
+    return scores.reshape(len(candidates), samples).mean(axis=1), bool(game.over.all())
+
+
+def bestMove(client, context, budget=BUDGET):
+    """
+    the move with the best mean score over games simulated from the client view within [budget] seconds:
+    our hand is sampled from the unseen cards our beliefs allow and every seat plays the rollout order.
+    None if there is no state to simulate from
+    """
+    deadline = time.perf_counter() + budget
+    if "tableCards" not in client.game_data or "handSize" not in client.game_data:
+        return None
+    position = observedPosition(client)
+    hands, sizes, _, _, me = position
+    candidates = candidateMoves(hands, me, sizes[me], client.game_data["usedNoteTokens"])
+    if len(candidates) == 0:
+        return None
+
+    # Drawn from the client random choices, so a seeded game with the same time gets the same samples
+    rng = np.random.default_rng(client.rng.getrandbits(32))
+    totals = np.zeros(len(candidates))
+    rounds = 0
+    round_time = 0
+    # A round is only started if it can end before the deadline, judging by the last one
+    while rounds == 0 or time.perf_counter() + round_time < deadline:
+        start = time.perf_counter()
+        result = playRound(client, rng, position, candidates, deadline)
+        if result is None:
+            return None
+        scores, complete = result
+        round_time = time.perf_counter() - start
+        if not complete:
+            # Games scored by their table would weigh as much as ended ones: kept only if no round ended
+            if rounds == 0:
+                totals = scores
+            break
+        totals += scores
+        rounds += 1
+
+    kind, slot, dest, hint_type, hint_value = candidates[int(totals.argmax())]
+    if kind == batch.PLAY:
+        return client.generatePlayMove(index=slot)
+    if kind == batch.DISCARD:
+        return client.generateDiscardMove(index=slot)
+    names = client.game_data["player_names"]
+    if hint_type == batch.COLOR_HINT:
+        return client.generateHintMove(hint_type="color", dest=names[dest], payload=COLORS[hint_value])
+    return client.generateHintMove(hint_type="value", dest=names[dest], payload=int(hint_value))
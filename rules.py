@@ -1,129 +1,98 @@
 import numpy as np
-import random
 import utils
+import rollout
 import SmartClient
+from context import TurnContext
 from copy import deepcopy
 
-DECK = utils.generateDeck()
-
 ## RULES FUNCTIONS
 
 
-def playIfCertain(client: SmartClient):
+def playIfCertain(client: SmartClient, context: TurnContext):
     """play a card with fully known information that is playable"""
-    table_cards = client.game_data["tableCards"]
-
-    for i, card_dict in enumerate(client.knowledge):
-        if utils.isCardKnown(card_dict) and utils.isCardPlayable(
-                card_dict, table_cards):
+    for i, card_dict in enumerate(context.handKnowledge()):
+        if utils.isCardKnown(card_dict) and context.isPlayable(
+                card_dict["color"], card_dict["value"]):
             return client.generatePlayMove(index=i), False
 
     return None, True
 
 
-def playJustHintedCard(client: SmartClient):
+def playJustHintedCard(client: SmartClient, context: TurnContext):
     """play the card that was hinted more recently"""
-    table_cards = client.game_data["tableCards"]
-
     if client.last_hinted_card is None:
         return None, True
 
-    if utils.isCardPlayable(client.knowledge[client.last_hinted_card],
-                            table_cards):
+    card_dict = client.knowledge[client.last_hinted_card]
+    if utils.isCardKnown(card_dict) and context.isPlayable(
+            card_dict["color"], card_dict["value"]):
         return client.generatePlayMove(index=client.last_hinted_card), False
 
     return None, True
 
 
-def hintPlayableCard(client: SmartClient):
+def hintPlayableCard(client: SmartClient, context: TurnContext):
     """give an hint about a playable card, choose randomly if value or color"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
 
-    table_cards = client.game_data["tableCards"]
-
-    for player in client.game_data["players"]:
-        if player.name == client.player_name:
-            continue
-        for card in player.hand:
-            if utils.isCardPlayable({
-                    "color": card.color,
-                    "value": card.value
-            },
-                                    table=table_cards):
-                hint = random.choice([("color", card.color),
-                                      ("value", card.value)])
-                return client.generateHintMove(hint_type=hint[0],
-                                               dest=player.name,
-                                               payload=hint[1]), False
+    playable_cards = context.partnersPlayableCards()
+    if len(playable_cards) == 0:
+        return None, True
 
-    return None, True
+    player, card = playable_cards[0]
+    hint = client.rng.choice([("color", card.color), ("value", card.value)])
+    return client.generateHintMove(hint_type=hint[0],
+                                   dest=player.name,
+                                   payload=hint[1]), False
 
 
-def hintValuePlayableCard(client: SmartClient):
+def hintValuePlayableCard(client: SmartClient, context: TurnContext):
     """give an hint about value of a playable card"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
 
-    table_cards = client.game_data["tableCards"]
-
-    for player in client.game_data["players"]:
-        if player.name == client.player_name:
-            continue
-        for card in player.hand:
-            if utils.isCardPlayable({
-                    "color": card.color,
-                    "value": card.value
-            },
-                                    table=table_cards):
-                hint = ("value", card.value)
-                return client.generateHintMove(hint_type=hint[0],
-                                               dest=player.name,
-                                               payload=hint[1]), False
+    playable_cards = context.partnersPlayableCards()
+    if len(playable_cards) == 0:
+        return None, True
 
-    return None, True
+    player, card = playable_cards[0]
+    hint = ("value", card.value)
+    return client.generateHintMove(hint_type=hint[0],
+                                   dest=player.name,
+                                   payload=hint[1]), False
 
 
-def hintColorPlayableCard(client: SmartClient):
+def hintColorPlayableCard(client: SmartClient, context: TurnContext):
     """give an hint about color of a playable card"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
 
-    table_cards = client.game_data["tableCards"]
-
-    for player in client.game_data["players"]:
-        if player.name == client.player_name:
-            continue
-        for card in player.hand:
-            if utils.isCardPlayable({
-                    "color": card.color,
-                    "value": card.value
-            },
-                                    table=table_cards):
-                hint = ("color", card.color)
-                return client.generateHintMove(hint_type=hint[0],
-                                               dest=player.name,
-                                               payload=hint[1]), False
+    playable_cards = context.partnersPlayableCards()
+    if len(playable_cards) == 0:
+        return None, True
 
-    return None, True
+    player, card = playable_cards[0]
+    hint = ("color", card.color)
+    return client.generateHintMove(hint_type=hint[0],
+                                   dest=player.name,
+                                   payload=hint[1]), False
 
 
-def discardUseless(client: SmartClient):
+def discardUseless(client: SmartClient, context: TurnContext):
     """discard a fully known and unplayable card"""
     if client.game_data["usedNoteTokens"] == 0:
         return None, True
 
-    table_cards = client.game_data["tableCards"]
-
-    for i, card_dict in enumerate(client.knowledge):
-        if utils.isCardKnown(card_dict) & (not utils.isCardPlayable(
-                card_dict, table_cards)):
+    for i, card_dict in enumerate(context.handKnowledge()):
+        if utils.isCardKnown(card_dict) and (not context.isPlayable(
+                card_dict["color"], card_dict["value"])):
             return client.generateDiscardMove(index=i), False
 
     return None, True
 
 
-def hintOnes(client: SmartClient):
+def hintOnes(client: SmartClient, context: TurnContext):
     """hint about a player's ones in hand"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
@@ -141,7 +110,7 @@ def hintOnes(client: SmartClient):
     return command, False
 
 
-def hintFives(client: SmartClient):
+def hintFives(client: SmartClient, context: TurnContext):
     """hint about a player's fives in hand"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
@@ -159,7 +128,7 @@ def hintFives(client: SmartClient):
     return command, False
 
 
-def hintRandom(client: SmartClient):
+def hintRandom(client: SmartClient, context: TurnContext):
     """give a random hint"""
     if client.game_data["usedNoteTokens"] >= 8:
         return None, True
@@ -170,7 +139,7 @@ def hintRandom(client: SmartClient):
     return command, err
 
 
-def playRandomMove(client: SmartClient):
+def playRandomMove(client: SmartClient, context: TurnContext):
     """just play a random legal move"""
     move = client.generateRandomMove()
     err = not (("hint" in move) or ("play" in move) or ("discard" in move))
@@ -180,20 +149,10 @@ def playRandomMove(client: SmartClient):
 def probablySafePlayMove(threshold):
     """play a card which is probably safe to play up to a given threshold"""
 
-    def evaluator(client: SmartClient):
-        cards = DECK
-        cards = utils.subtractCardsFrom(cards, client.game_data["tableCards"])
-        cards = utils.subtractCardsFrom(cards,
-                                        utils.getOtherPlayersCards(client))
-        cards = utils.subtractCardsFrom(
-            cards, utils.getDiscardedCards(client.game_data["discardPile"]))
-
+    def evaluator(client: SmartClient, context: TurnContext):
+        # playability over the cards we cannot see, shared with the other rules of the turn
         best_move = (-1, -1)
-        for i, _ in enumerate(client.knowledge):
-            p = utils.calculatePlayability(
-                client.knowledge[i],
-                possible_cards=cards,
-                table_cards=client.game_data["tableCards"])
+        for i, p in enumerate(context.slotsPlayability()):
             if (p >= threshold) & (p > best_move[1]):
                 best_move = (i, p)
 
@@ -205,52 +164,52 @@ def probablySafePlayMove(threshold):
     return evaluator
 
 
-def certainlySafePlayMove(client):
+def certainlySafePlayMove(client: SmartClient, context: TurnContext):
     """same to probablySafePlayMove() but with threshold = 1"""
-    return probablySafePlayMove(1)(client)
+    return probablySafePlayMove(1)(client, context)
 
 
 def probablySafePlayMoveWithStormTokensLeft(threshold):
     """same to probablySafePlayMove() but only if we have still at least one chance of error -> we can take bigger risks"""
 
-    def evaluator(client: SmartClient):
+    def evaluator(client: SmartClient, context: TurnContext):
         if client.game_data["usedStormTokens"] < 2:
-            return probablySafePlayMove(threshold)(client)
+            return probablySafePlayMove(threshold)(client, context)
 
         return None, True
 
     return evaluator
 
 
-def discardOldestCard(client):
+def discardOldestCard(client: SmartClient, context: TurnContext):
     """discard card which has been in player's hand the longer"""
     if client.game_data["usedNoteTokens"] == 0:
         return None, True
 
-    index, _ = min(enumerate(client.knowledge),
+    index, _ = min(enumerate(context.handKnowledge()),
                    key=(lambda item: item[1]["last_update"]))
 
     return client.generateDiscardMove(index=index), False
 
 
-def discardUnidentifiedCard(client):
+def discardUnidentifiedCard(client: SmartClient, context: TurnContext):
     """discard a card we don't know anything about"""
     if client.game_data["usedNoteTokens"] == 0:
         return None, True
 
-    for i, card in enumerate(client.knowledge):
+    for i, card in enumerate(context.handKnowledge()):
         if utils.isCardUnidentified(card):
             return client.generateDiscardMove(index=i), False
 
     return None, True
 
 
-def discardOldestUnidentifiedCard(client):
+def discardOldestUnidentifiedCard(client: SmartClient, context: TurnContext):
     """same as discardUnidentifiedCard but we discard the one which has been in player's hand the longer"""
     if client.game_data["usedNoteTokens"] == 0:
         return None, True
 
-    hand = deepcopy(client.knowledge)
+    hand = deepcopy(context.handKnowledge())
     for i, c in enumerate(hand):
         hand[i]["index"] = i
     no_info = list(filter(lambda card: utils.isCardUnidentified(card), hand))
@@ -267,24 +226,11 @@ def discardOldestUnidentifiedCard(client):
 def probablySafeDiscardMove(threshold):
     """discard a card which is probably safe to discard up to a given threshold"""
 
-    def evaluator(client: SmartClient):
-        # make set of all cards
-        # then subtract cards on table, in other player's hands & in discard pile
-        cards = DECK
-        cards = utils.subtractCardsFrom(cards, client.game_data["tableCards"])
-        cards = utils.subtractCardsFrom(cards,
-                                        utils.getOtherPlayersCards(client))
-        cards = utils.subtractCardsFrom(
-            cards, utils.getDiscardedCards(client.game_data["discardPile"]))
-
-        # calc playability probability of each card in own hand (over the refined set)
+    def evaluator(client: SmartClient, context: TurnContext):
+        # playability probability of each card in own hand (over the unseen cards) is shared with the other rules of the turn
         # keep track of card with highest playability probability vs. threshold
         useless_move = (-1, -1)
-        for i, _ in enumerate(client.knowledge):
-            p = 1 - utils.calculatePlayability(
-                client.knowledge[i],
-                possible_cards=cards,
-                table_cards=client.game_data["tableCards"])
+        for i, p in enumerate(context.slotsDiscardability()):
             if (p >= threshold) & (p > useless_move[1]):
                 useless_move = (i, p)
 
@@ -297,6 +243,19 @@ def probablySafeDiscardMove(threshold):
     return evaluator
 
 
+def monteCarloRollout(budget):
+    """play the move with the best mean score over simulated games from our hand as we believe it, thinking [budget] seconds"""
+
+    def evaluator(client: SmartClient, context: TurnContext):
+        move = rollout.bestMove(client, context, budget)
+        if move is None:
+            return None, True
+
+        return move, False
+
+    return evaluator
+
+
 ################################################################################################
 
 RULES = np.array([
@@ -324,9 +283,57 @@ RULES = np.array([
     probablySafeDiscardMove(0.8),  # 21
     probablySafeDiscardMove(0.65),  # 22
     probablySafeDiscardMove(0.5),  # 23
+    # Search rules: too slow for evolution (and their moves depend on time), they only go in hand-written orders
+    monteCarloRollout(rollout.BUDGET),  # 24
+])
+# Whether a rule may return an error (or an invalid move), letting the next rule in the order fire
+CAN_FAIL = np.array([
+    True,  # 0
+    True,  # 1
+    True,  # 2
+    True,  # 3
+    True,  # 4
+    True,  # 5
+    True,  # 6
+    True,  # 7
+    True,  # 8
+    False,  # 9 a random move is always legal
+    True,  # 10
+    True,  # 11
+    True,  # 12
+    True,  # 13
+    True,  # 14
+    True,  # 15
+    True,  # 16
+    True,  # 17
+    True,  # 18
+    True,  # 19
+    False,  # 20 a random move is always legal
+    True,  # 21
+    True,  # 22
+    True,  # 23
+    True,  # 24 no move if our hand cannot be sampled
 ])
-DEFAULT_ORDER = list(range(0, len(RULES)))
+# Rules evolved by evolve.py, the search rules are left out
+NUM_EVOLVED_RULES = 24
+DEFAULT_ORDER = list(range(0, NUM_EVOLVED_RULES))
 
 
 def getRulesInOrder(order):
     return RULES[order]
+
+
+def canonicalOrder(order):
+    """
+    returns the part of a rule order that can actually fire, as a tuple:
+    rules after one that cannot fail are never reached, and rules sharing the same function are the same rule
+    """
+    canonical = []
+    for index in order:
+        index = int(index)
+        # the first occurrence of a function stands for all its copies (e.g. playRandomMove)
+        index = next(i for i in range(len(RULES)) if RULES[i] is RULES[index])
+        canonical.append(index)
+        if not CAN_FAIL[index]:
+            break
+    return tuple(canonical)
@@ -1,137 +1,406 @@
 import os
+import asyncio
 import GameData
-import socket
+import framing
+import headless
+import rules
+import transport
 from game import Game
 from game import Player
 import threading
+from multiprocessing import Pipe, Process
 from constants import *
+from SmartClient import SmartClient
 from signal import signal, SIGPIPE, SIG_DFL
 import logging
 import sys
 
-mutex = threading.Lock()
 # SERVER
-playerConnections = {}
-game = Game()
-
-mutex = threading.Lock()
-
-playersOk = []
+# Everything runs in the event loop thread: requests are handled one at a time between two awaits,
+# so the games need no lock, and sending only queues the message on the connection
+# Tables by name, each one with its own game and lobby
+tables = {}
+numPlayers = 2
+# Deck seed of the tables created without one
+defaultSeed = None
+# Keep running when every player left, to host table after table
+persistent = False
 
 statuses = [
     "Lobby",
     "Game"
 ]
-status = statuses[0]
 
-commandQueue = {}
-numPlayers = 2
+# Bytes a client may leave unread before the messages for it are queued
+WRITE_BUFFER_LIMIT = 64 * 1024
+
+
+class Connection:
+    """
+    A client connection. Messages go straight to the transport buffer, but once a slow client
+    lets it grow past WRITE_BUFFER_LIMIT they are queued and written by a task of their own
+    as the buffer drains, so a slow client never holds up the game or the other players.
+    The codec is the one of the connection request (see framing.py).
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.codec = PICKLE_CODEC
+        self.queue = asyncio.Queue()
+        # True while messages must wait in the queue
+        self.backlog = False
+        self.writerTask = asyncio.ensure_future(self.writeLoop())
+
+    def send(self, data: GameData.GameData):
+        frame = framing.encodeFrame(data, self.codec)
+        if self.backlog:
+            self.queue.put_nowait(frame)
+            return
+        self.writer.write(frame)
+        if self.writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+            self.backlog = True
+            # an empty frame just makes the writer task wait for the buffer to drain
+            self.queue.put_nowait(b"")
+
+    async def read(self):
+        """returns the next message of the client, None once it disconnected"""
+        frame = await framing.readFrameAsync(self.reader)
+        if frame is None:
+            return None
+        self.codec = framing.frameCodec(frame)
+        return framing.decodeFrame(frame)
+
+    async def writeLoop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is None:
+                    break
+                self.writer.write(frame)
+                if self.queue.empty():
+                    await self.writer.drain()
+                    self.backlog = not self.queue.empty()
+            self.writer.close()
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def close(self):
+        """writes the pending messages and closes the connection"""
+        self.queue.put_nowait(None)
+        await self.writerTask
+
+
+class Table:
+    """
+    A game and its lobby. Players join a table with their connection request,
+    and a table runs independently from the others.
+    Seats can also be taken by bots: SmartClients without socket living in the server,
+    fed the messages of the table as the other players and moving straight on the game
+    when their turn comes, from the state their player is shown (own cards hidden).
+    """
+
+    def __init__(self, name: str, nplayers: int, seed=None) -> None:
+        self.name = name
+        self.numPlayers = nplayers
+        # The seed only applies to the first game, the following ones are shuffled randomly
+        self.game = Game(seed)
+        self.playerConnections = {}
+        # Players receiving a ServerGameStateDelta after every move instead of asking for the state
+        self.subscribers = set()
+        self.playersOk = []
+        self.status = statuses[0]
+        self.commandQueue = {}
+        # Bots by player name, see addBot
+        self.bots = {}
+        # Connections that only seated bots: they get the messages of the table without playing
+        self.watchers = set()
+        # True from the game start to the game over
+        self.started = False
+        # The task playing the turns of the bots, while one of them is in turn
+        self.botTask = None
+
+    def isOpen(self):
+        """tells if players can still sit at the table"""
+        return self.status == "Lobby" and not self.started and \
+            len(self.playerConnections) + len(self.bots) < self.numPlayers
+
+    def getStateDeltas(self):
+        """what changed with the last move for every subscribed player, nothing once the game is over"""
+        if self.game.isGameOver():
+            return {}
+        return {name: self.game.getStateDelta(name) for name in self.subscribers}
+
+    def broadcast(self, multipleData):
+        """sends the result of a move to every player, followed by its state delta if subscribed"""
+        deltas = self.getStateDeltas()
+        for id in self.playerConnections:
+            self.playerConnections[id].send(multipleData)
+            if id in deltas:
+                self.playerConnections[id].send(deltas[id])
+        for connection in self.watchers:
+            connection.send(multipleData)
+        if type(multipleData) is GameData.ServerGameOver:
+            # Bots would only dump their results to file
+            return
+        for bot in self.bots.values():
+            bot.processData(multipleData)
+            bot.receiveHint(multipleData)
+
+    def addPlayer(self, connection, playerName: str):
+        """seats a player, returns False if the name is taken"""
+        # Bots take their name too, as in addBot
+        if playerName in self.playerConnections.keys() or playerName in self.bots or playerName == "" or playerName is None:
+            logging.warning(f"Duplicate player: {playerName}")
+            connection.send(GameData.ServerActionInvalid(
+                "Player with that name already registered."))
+            return False
+        self.commandQueue[playerName] = []
+        self.playerConnections[playerName] = connection
+        #logging.info("Player connected: " + playerName)
+        self.game.addPlayer(playerName)
+        connection.send(GameData.ServerPlayerConnectionOk(playerName, self.name))
+        return True
+
+    def addBot(self, connection, name: str, rulesOrder):
+        """
+        seats a bot playing the rules in rulesOrder (the default order if empty), always ready to start.
+        returns False if the name is taken or the table is full
+        """
+        if name in self.playerConnections or name in self.bots:
+            connection.send(GameData.ServerActionInvalid(
+                "Player with that name already registered."))
+            return False
+        if not self.isOpen():
+            connection.send(GameData.ServerActionInvalid("The table is full."))
+            return False
+        bot = SmartClient(name, None, None, rules_order=list(rulesOrder) or rules.DEFAULT_ORDER)
+        bot.ready = True
+        self.bots[name] = bot
+        self.commandQueue[name] = []
+        self.game.addPlayer(name)
+        self.game.setPlayerReady(name)
+        connection.send(GameData.ServerPlayerConnectionOk(name, self.name))
+        self.startIfReady()
+        return True
 
+    def removePlayer(self, playerName: str):
+        self.playerConnections.pop(playerName, None)
+        self.subscribers.discard(playerName)
+        #logging.warning("Player disconnected: " + playerName)
+        self.game.removePlayer(playerName)
 
-def manageConnection(conn: socket, addr):
-    global status
-    global game
-    with conn:
-        #logging.info("Connected by: " + str(addr))
-        keepActive = True
-        playerName = ""
-        while keepActive:
-            #print("SERVER WAITING")
-            data = conn.recv(DATASIZE)
-
-            mutex.acquire(True)
-
-            if not data:
-                del playerConnections[playerName]
-                #logging.warning("Player disconnected: " + playerName)
-                game.removePlayer(playerName)
-                if len(playerConnections) == 0:
-                    #logging.info("Shutting down server")
-                    os._exit(0)
-                keepActive = False
-            else:
-                #print(
-                #    f"SERVER PROCESSING {GameData.GameData.deserialize(data)}")
-                data = GameData.GameData.deserialize(data)
-                #print(f"SERVER RECEIVED {type(data)} from {data.sender}")
-                if status == "Lobby":
-                    if type(data) is GameData.ClientPlayerAddData:
-                        playerName = data.sender
-                        commandQueue[playerName] = []
-                        if playerName in playerConnections.keys() or playerName == "" and playerName is None:
-                            logging.warning("Duplicate player: " + playerName)
-                            conn.send(GameData.ServerActionInvalid(
-                                "Player with that name already registered.").serialize())
-                            mutex.release()
-                            return
-                        playerConnections[playerName] = (conn, addr)
-                        #logging.info("Player connected: " + playerName)
-                        game.addPlayer(playerName)
-                        conn.send(GameData.ServerPlayerConnectionOk(
-                            playerName).serialize())
-                    elif type(data) is GameData.ClientPlayerStartRequest:
-                        game.setPlayerReady(playerName)
-                        #logging.info("Player ready: " + playerName)
-                        conn.send(GameData.ServerPlayerStartRequestAccepted(
-                            len(game.getPlayers()), game.getNumReadyPlayers()).serialize())
-
-                        if len(game.getPlayers()) == game.getNumReadyPlayers() and len(game.getPlayers()) >= numPlayers:
-                            listNames = []
-                            for player in game.getPlayers():
-                                listNames.append(player.name)
-                            #logging.info("Game start! Between: " + str(listNames))
-                            for player in playerConnections:
-                                playerConnections[player][0].send(
-                                    GameData.ServerStartGameData(listNames).serialize())
-                            game.start()
-
-                    # This ensures every player is ready to send requests
-                    elif type(data) is GameData.ClientPlayerReadyData:
-                        playersOk.append(1)
-                    # If every player is ready to send requests, then the game can start
-                    if len(playersOk) == len(game.getPlayers()):
-                        status = "Game"
-                        for player in commandQueue:
-                            for cmd in commandQueue[player]:
-                                singleData, multipleData = game.satisfyRequest(
-                                    cmd, player)
-                                if singleData is not None:
-                                    playerConnections[player][0].send(
-                                        singleData.serialize())
-                                if multipleData is not None:
-                                    for id in playerConnections:
-                                        playerConnections[id][0].send(
-                                            multipleData.serialize())
-                                        if game.isGameOver():
-                                            os._exit(0)
-                        commandQueue.clear()
-                    elif type(data) is not GameData.ClientPlayerAddData and type(
-                            data) is not GameData.ClientPlayerStartRequest and type(
-                            data) is not GameData.ClientPlayerReadyData:
-                        commandQueue[playerName].append(data)
-                # In game
-                elif status == "Game":
-                    singleData, multipleData = game.satisfyRequest(
-                        data, playerName)
-                    if singleData is not None:
-                        conn.send(singleData.serialize())
-                    if multipleData is not None:
-                        for id in playerConnections:
-                            playerConnections[id][0].send(
-                                multipleData.serialize())
-                            if game.isGameOver():
-                                #logging.info("Game over")
-                                #logging.info("Game score: " + str(game.getScore()))
-                                # os._exit(0)
-                                players = game.getPlayers()
-                                game = Game()
-                                for player in players:
-                                    #logging.info("Starting new game")
-                                    game.addPlayer(player.name)
-                                game.start()
-
-                #game.displayStatus()
-            mutex.release()
+    def manageData(self, connection, playerName: str, data):
+        """handles a message of a seated player"""
+        game = self.game
+        if self.status == "Lobby":
+            if type(data) is GameData.ClientPlayerStartRequest:
+                if getattr(data, "seed", None) is not None:
+                    game.setSeed(data.seed)
+                game.setPlayerReady(playerName)
+                #logging.info("Player ready: " + playerName)
+                connection.send(GameData.ServerPlayerStartRequestAccepted(
+                    len(game.getPlayers()), game.getNumReadyPlayers()))
+                self.startIfReady()
+            elif type(data) is GameData.ClientStateSubscriptionRequest:
+                self.subscribers.add(playerName)
+            # This ensures every player is ready to send requests
+            elif type(data) is GameData.ClientPlayerReadyData:
+                self.playersOk.append(1)
+            # If every player is ready to send requests, then the game can start
+            if self.everyoneReady():
+                self.enterGame()
+            elif type(data) is not GameData.ClientPlayerAddData and type(
+                    data) is not GameData.ClientPlayerStartRequest and type(
+                    data) is not GameData.ClientPlayerReadyData and type(
+                    data) is not GameData.ClientStateSubscriptionRequest:
+                self.commandQueue[playerName].append(data)
+        # In game
+        elif self.status == "Game":
+            singleData, multipleData = game.satisfyRequest(data, playerName)
+            if singleData is not None:
+                connection.send(singleData)
+            if multipleData is not None:
+                self.broadcast(multipleData)
+                if game.isGameOver():
+                    #logging.info("Game over")
+                    #logging.info("Game score: " + str(game.getScore()))
+                    self.restart()
+                else:
+                    self.playBots()
+
+        #game.displayStatus()
+
+    def startIfReady(self):
+        """starts the game once the table is full and every player asked to start"""
+        game = self.game
+        if self.started or len(game.getPlayers()) != game.getNumReadyPlayers() or len(game.getPlayers()) < self.numPlayers:
+            return
+        listNames = []
+        for player in game.getPlayers():
+            listNames.append(player.name)
+        #logging.info("Game start! Between: " + str(listNames))
+        startData = GameData.ServerStartGameData(listNames)
+        for player in self.playerConnections:
+            self.playerConnections[player].send(startData)
+        for connection in self.watchers:
+            connection.send(startData)
+        game.start()
+        self.started = True
+        for bot in self.bots.values():
+            bot.processData(startData)
+        # Bots need no ready message: a table of bots only plays right away
+        if self.everyoneReady():
+            self.enterGame()
+
+    def everyoneReady(self):
+        """tells if the game started and every player on a connection confirmed it"""
+        return self.started and len(self.playersOk) + len(self.bots) == len(self.game.getPlayers())
+
+    def enterGame(self):
+        """leaves the lobby: plays the commands queued meanwhile, then the bots if one of them starts"""
+        game = self.game
+        self.status = "Game"
+        # Subscribed players get the whole state once, then only deltas
+        for player in self.subscribers:
+            singleData, _ = game.satisfyRequest(
+                GameData.ClientGetGameStateRequest(player), player)
+            self.playerConnections[player].send(singleData)
+        for player in self.commandQueue:
+            for cmd in self.commandQueue[player]:
+                singleData, multipleData = game.satisfyRequest(cmd, player)
+                if singleData is not None:
+                    self.playerConnections[player].send(singleData)
+                if multipleData is not None:
+                    self.broadcast(multipleData)
+                    # The same as a game over in manageData: back to the lobby, the queued commands are dropped
+                    if game.isGameOver():
+                        self.restart()
+                        return
+        self.commandQueue.clear()
+        self.playBots()
+
+    def playBots(self):
+        """lets the bots play if one of them is in turn, see botTurns"""
+        if self.bots and self.botTask is None:
+            self.botTask = asyncio.ensure_future(self.botTurns())
+
+    async def botTurns(self):
+        """
+        plays the turns of the bots until a player on a connection is in turn,
+        the other tables run between two turns
+        """
+        game = self.game
+        while self.status == "Game" and self.game is game and tables.get(self.name) is self:
+            bot = next((bot for bot in self.bots.values() if bot.isMyTurn()), None)
+            if bot is None:
+                break
+            # The 'show' answer: the view of the bot, without its own cards
+            state, _ = game.satisfyRequest(GameData.ClientGetGameStateRequest(bot.player_name), bot.player_name)
+            bot.processData(state)
+            multipleData = headless.playBotTurn(bot, game, rules.getRulesInOrder(bot.rules_order))
+            if multipleData is None:
+                logging.warning("Bot " + bot.player_name + " cannot move at table " + self.name)
+                break
+            self.broadcast(multipleData)
+            if game.isGameOver():
+                # A table of bots only starts its next game right away, with a task of its own
+                self.botTask = None
+                self.restart()
+                return
+            await asyncio.sleep(0)
+        self.botTask = None
+
+    def restart(self):
+        """brings the players back to the lobby with a new game, they start it as the first one"""
+        players = self.game.getPlayers()
+        self.game = Game()
+        self.commandQueue = {}
+        for player in players:
+            #logging.info("Starting new game")
+            self.game.addPlayer(player.name)
+            self.commandQueue[player.name] = []
+        for name, bot in self.bots.items():
+            bot.resetGameState()
+            self.game.setPlayerReady(name)
+        self.playersOk = []
+        self.started = False
+        self.status = statuses[0]
+        # Bots are ready at once: without players on a connection the next game starts now
+        self.startIfReady()
+
+    async def close(self):
+        """lets every player (and watcher) receive its last messages and closes their connections"""
+        connections = list(self.playerConnections.values()) + list(self.watchers)
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+
+def chooseTable(name=None, seed=None):
+    """the table with the given name, created if needed, or the first one still waiting for players"""
+    if name is None:
+        name = next((table.name for table in tables.values() if table.isOpen()), None)
+        if name is None:
+            index = len(tables)
+            while f"table-{index}" in tables:
+                index += 1
+            name = f"table-{index}"
+    if name not in tables:
+        tables[name] = Table(name, numPlayers, seed if seed is not None else defaultSeed)
+    return tables[name]
+
+
+async def manageConnection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    connection = Connection(reader, writer)
+    #logging.info("Connected by: " + str(writer.get_extra_info("peername")))
+    playerName = ""
+    table = None
+    while True:
+        #print("SERVER WAITING")
+        data = await connection.read()
+
+        if data is None:
+            if table is not None:
+                if connection in table.watchers:
+                    table.watchers.discard(connection)
+                else:
+                    table.removePlayer(playerName)
+                if len(table.playerConnections) + len(table.watchers) == 0 and tables.get(table.name) is table:
+                    del tables[table.name]
+            if len(tables) == 0 and not persistent:
+                #logging.info("Shutting down server")
+                transport.removeTemporarySockets()
+                os._exit(0)
+            await connection.close()
+            return
+
+        #print(f"SERVER RECEIVED {type(data)} from {data.sender}")
+        if type(data) is GameData.ClientBotSeatRequest:
+            if table is None:
+                # A connection only seating bots watches their table
+                table = chooseTable(getattr(data, "table", None), getattr(data, "seed", None))
+                table.watchers.add(connection)
+            table.addBot(connection, data.name, data.rulesOrder)
+            continue
+        if table is None:
+            if type(data) is not GameData.ClientPlayerAddData:
+                connection.send(GameData.ServerInvalidDataReceived(
+                    "Ask to join a table first"))
+                continue
+            playerName = data.sender
+            # Clients not asking for a table get one still waiting for players
+            table = chooseTable(getattr(data, "table", None), getattr(data, "seed", None))
+            if not table.addPlayer(connection, playerName):
+                # Refused connection request
+                await connection.close()
+                return
+            continue
+        if connection in table.watchers:
+            connection.send(GameData.ServerInvalidDataReceived(
+                "Watchers can only seat bots"))
+            continue
+
+        table.manageData(connection, playerName, data)
 
 
 def manageInput():
@@ -139,31 +408,64 @@ def manageInput():
         data = input()
         if data == "exit":
             logging.info("Closing the server...")
+            transport.removeTemporarySockets()
             os._exit(0)
 
 
-def manageNetwork():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        #logging.info("Hanabi server started on " + HOST + ":" + str(PORT))
-        while True:
-            s.listen()
-            conn, addr = s.accept()
-            threading.Thread(target=manageConnection,
-                             args=(conn, addr)).start()
+async def manageNetwork(address, ready=None, sockets=None):
+    server, address = await transport.serve(address, manageConnection, sockets)
+    #logging.info("Hanabi server started on " + address)
+    if ready is not None:
+        ready.send(address)
+        ready.close()
+    if server is None:
+        # Socket pairs are already connected: wait for their players to leave
+        await asyncio.get_running_loop().create_future()
+    async with server:
+        await server.serve_forever()
 
 
-def start_server(nplayers):
+def start_server(nplayers, seed=None, keep_running=False, address=transport.DEFAULT_ADDRESS, ready=None, sockets=None):
+    """
+    address selects the transport, see transport.py. With "socketpair", sockets are the server ends of the pairs.
+    ready, if given, is the end of a pipe receiving the bound address once clients can connect.
+    """
     global numPlayers
+    global defaultSeed
+    global persistent
     numPlayers = nplayers
+    defaultSeed = seed
+    persistent = keep_running
     logging.basicConfig(filename="game.log", level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s',
                         datefmt="%m/%d/%Y %I:%M:%S %p")
     logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
-    threading.Thread(target=manageNetwork).start()
+    threading.Thread(target=asyncio.run, args=(manageNetwork(address, ready, sockets), )).start()
     #manageInput()
 
 
+def launchServer(nplayers, seed=None, address=f"{transport.TCP}://{HOST}:0", keep_running=False, seats=None):
+    """
+    runs a server in a new process and waits until it accepts connections (the system picks the port by default).
+    returns the process and the address every client connects to, one per seat: the same one
+    except for "socketpair", where each seat gets the client end of its own pair (seats defaults to nplayers)
+    """
+    seats = nplayers if seats is None else seats
+    sockets, addresses = None, None
+    if transport.parseAddress(address)[0] == transport.SOCKETPAIR:
+        sockets, addresses = transport.socketPairs(seats)
+    ready, server_ready = Pipe(duplex=False)
+    server_process = Process(target=start_server,
+                             args=(nplayers, seed, keep_running, address, server_ready, sockets))
+    server_process.start()
+    server_ready.close()
+    if sockets is not None:
+        transport.release(sockets)
+    address = ready.recv()
+    if addresses is None:
+        addresses = [address] * seats
+    return server_process, addresses
+
+
 if __name__ == '__main__':
     signal(SIGPIPE, SIG_DFL)
     print("Type 'exit' to end the program")
@@ -171,4 +473,4 @@ if __name__ == '__main__':
         if int(sys.argv[1]) > 1:
             numPlayers = int(sys.argv[1])
 
-    start_server(numPlayers)
+    start_server(numPlayers, address=sys.argv[2] if len(sys.argv) > 2 else transport.DEFAULT_ADDRESS)
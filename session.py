@@ -0,0 +1,56 @@
+import rules
+import server
+import transport
+from multiprocessing import Pipe, Process
+from SmartClient import SmartClient
+from constants import HOST, PICKLE_CODEC
+
+NUM_PLAYERS = 2
+
+
+class SocketSession:
+    """
+    A server and its clients kept running across games: the clients stay connected
+    and go back to the lobby of their table after every game (see SmartClient.gameOver),
+    so a game only costs its moves, not starting processes and connecting.
+    Every game gets its own strategy and seed through a pipe to each client.
+    The server listens on address, a free TCP port by default, any transport of transport.py works.
+    """
+
+    def __init__(self, num_players=NUM_PLAYERS, codec=PICKLE_CODEC, subscribe=False, address=f"{transport.TCP}://{HOST}:0") -> None:
+        self.server_process, addresses = server.launchServer(num_players, address=address)
+
+        self.pipes = []
+        self.players = []
+        for i in range(0, num_players):
+            pipe, client_pipe = Pipe()
+            player_process = Process(target=SmartClient(
+                f"SmartClient-{i}", addresses[i], None, codec=codec, subscribe=subscribe,
+                session=client_pipe).start)
+            player_process.start()
+            # Only the client keeps its end: if it dies, play gets an EOFError instead of waiting forever
+            client_pipe.close()
+            self.pipes.append(pipe)
+            self.players.append(player_process)
+        transport.release(addresses)
+
+    def play(self, strategy, seed=None):
+        """plays one game between players having all the same strategy and returns the obtained score"""
+        for pipe in self.pipes:
+            pipe.send((list(strategy), seed))
+        # Same as utils.getScoreFromClients: the best table seen by a player
+        return max(pipe.recv() for pipe in self.pipes)
+
+    def close(self):
+        """disconnects the clients, the server stops once they are gone"""
+        for pipe in self.pipes:
+            pipe.send(None)
+        for player in self.players:
+            player.join()
+        self.server_process.join()
+
+
+if __name__ == "__main__":
+    session = SocketSession()
+    print([session.play(rules.DEFAULT_ORDER, seed) for seed in range(4)])
+    session.close()
@@ -0,0 +1,67 @@
+import pytest
+import framing
+import GameData
+from game import CARDS, Game
+from testhelpers import comparable
+from constants import PICKLE_CODEC, BINARY_CODEC
+
+
+def sampleMessages():
+    """one message of every GameData class, with game states taken from a real game"""
+    game = Game(seed=0)
+    for name in ["alice", "bob", "carol"]:
+        game.addPlayer(name)
+    game.start()
+    state, _ = game.satisfyRequest(GameData.ClientGetGameStateRequest("alice"), "alice")
+    _, hint = game.satisfyRequest(GameData.ClientHintData("alice", "bob", "value", CARDS[0].value), "alice")
+    return [
+        GameData.ClientHintData("alice", "bob", "color", "red"),
+        GameData.ClientHintData("alice", "bob", "value", 3),
+        GameData.ClientPlayerAddData("alice"),
+        GameData.ClientPlayerStartRequest("alice"),
+        GameData.ClientPlayerReadyData("alice"),
+        GameData.ClientGetGameStateRequest("alice"),
+        GameData.ClientStateSubscriptionRequest("alice"),
+        GameData.ClientBotSeatRequest("alice", "bot", [0, 1, 3, 4, 5], "table-0", 7),
+        GameData.ClientPlayerDiscardCardRequest("alice", 2),
+        GameData.ClientPlayerPlayCardRequest("alice", 4),
+        hint if type(hint) is GameData.ServerHintData else GameData.ServerHintData("alice", "bob", "value", 1, [0, 3], "bob"),
+        GameData.ServerPlayerConnectionOk("alice"),
+        GameData.ServerPlayerStartRequestAccepted(3, 2),
+        GameData.ServerStartGameData(["alice", "bob", "carol"]),
+        state,
+        game.getStateDelta("alice"),
+        GameData.ServerGameStateDelta("bob", 4, {"alice": (2, CARDS[3]), "bob": (0, None)}, [CARDS[0]], [CARDS[9]], 3, 1),
+        GameData.ServerActionValid("bob", "alice", "discard", CARDS[7], 1, 5),
+        GameData.ServerPlayerMoveOk("bob", "alice", CARDS[0], 0, 4),
+        GameData.ServerPlayerThunderStrike("bob", "alice", CARDS[24], 3, 5),
+        GameData.ServerActionInvalid("It is not your turn yet"),
+        GameData.ServerInvalidDataReceived("You cannot give hints about cards that the other person does not have"),
+        GameData.ServerInvalidDataReceived(GameData.ClientPlayerAddData("alice")),
+        GameData.ServerGameOver(12, "Good!"),
+    ]
+
+
+MESSAGES = sampleMessages()
+
+
+def testEveryMessageTypeIsSampled():
+    assert set(type(message) for message in MESSAGES) == set(framing.binarycodec.MESSAGE_TYPES)
+
+
+@pytest.mark.parametrize("codec", [PICKLE_CODEC, BINARY_CODEC])
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda message: type(message).__name__)
+def testRoundTrip(message, codec):
+    frame = framing.encodeFrame(message, codec)
+    assert framing.frameCodec(frame) == codec
+    assert comparable(framing.decodeFrame(frame)) == comparable(message)
+
+
+def testCardsKeepTheirId():
+    # Two copies of a card are different cards on both sides
+    copies = [card for card in CARDS if card.value == 1 and card.color == "red"]
+    assert len(copies) == 3
+    message = GameData.ServerGameStateDelta("bob", 5, {}, copies, [], 0, 0)
+    for codec in (PICKLE_CODEC, BINARY_CODEC):
+        decoded = framing.decodeFrame(framing.encodeFrame(message, codec))
+        assert len(set(decoded.playedCards)) == 3
@@ -0,0 +1,10 @@
+import botrunner
+
+# See test_session.py: on seed 0 with 4 players the game ends before the last seat moved
+STORM_ORDER = [21, 22, 23, 9]
+
+
+def testGameOverBeforeEverySeatMoved():
+    scores = botrunner.playAsyncGames([STORM_ORDER, STORM_ORDER], 4, [0, 1], subscribe=False)
+    assert scores[0] == 0
+    assert scores[1] >= 0
@@ -0,0 +1,36 @@
+import pytest
+import botrunner
+import headless
+import rules
+import session
+
+SEEDS = [0, 1, 2]
+# The default order has random rules (2, 8, 9, 20) firing, the second one other random rules first
+ORDERS = [rules.DEFAULT_ORDER, [9, 8, 2, 20] + [rule for rule in rules.DEFAULT_ORDER if rule not in (2, 8, 9, 20)]]
+
+
+def headlessScores(num_players, subscribe):
+    return [headless.playHeadlessGame(order, num_players, seed, subscribe) for order in ORDERS for seed in SEEDS]
+
+
+@pytest.mark.parametrize("subscribe", [False, True])
+@pytest.mark.parametrize("num_players", [2, 4])
+def testSessionPlaysAsHeadless(num_players, subscribe, tmp_path, monkeypatch):
+    # The clients dump their results to outputs/ when the session closes
+    (tmp_path / "outputs").mkdir()
+    monkeypatch.chdir(tmp_path)
+    game_session = session.SocketSession(num_players, subscribe=subscribe)
+    try:
+        scores = [game_session.play(order, seed) for order in ORDERS for seed in SEEDS]
+    finally:
+        game_session.close()
+    assert scores == headlessScores(num_players, subscribe)
+
+
+@pytest.mark.parametrize("subscribe", [False, True])
+@pytest.mark.parametrize("num_players", [2, 4])
+def testAsyncSeatsPlayAsHeadless(num_players, subscribe):
+    strategies = [order for order in ORDERS for _ in SEEDS]
+    seeds = [seed for _ in ORDERS for seed in SEEDS]
+    scores = botrunner.playAsyncGames(strategies, num_players, seeds, subscribe=subscribe)
+    assert list(scores) == headlessScores(num_players, subscribe)
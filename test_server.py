@@ -0,0 +1,45 @@
+import pytest
+import framing
+import GameData
+import server
+import transport
+from constants import BINARY_CODEC
+
+
+@pytest.fixture
+def serverAddress(tmp_path, monkeypatch):
+    """a 2 player server on a free TCP port, logging to a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    server_process, addresses = server.launchServer(2)
+    yield addresses[0]
+    server_process.kill()
+    server_process.join()
+
+
+def request(connection, reader, data):
+    """sends a request and returns the answer"""
+    framing.sendData(connection, data, BINARY_CODEC)
+    return reader.read()
+
+
+def testPlayerCannotTakeTheNameOfABot(serverAddress):
+    with transport.connect(serverAddress) as watcher, transport.connect(serverAddress) as player:
+        answer = request(watcher, framing.FrameReader(watcher), GameData.ClientBotSeatRequest("alice", "bob", [], "table"))
+        assert type(answer) is GameData.ServerPlayerConnectionOk
+        answer = request(player, framing.FrameReader(player), GameData.ClientPlayerAddData("bob", "table"))
+        assert type(answer) is GameData.ServerActionInvalid
+
+
+def testTableOfBotsKeepsPlaying(serverAddress):
+    with transport.connect(serverAddress) as watcher:
+        # A table stuck after its first game fails the test instead of hanging it
+        watcher.settimeout(10)
+        reader = framing.FrameReader(watcher)
+        for name in ["alice", "bob"]:
+            answer = request(watcher, reader, GameData.ClientBotSeatRequest("watcher", name, [], "bots"))
+            assert type(answer) is GameData.ServerPlayerConnectionOk
+        games = 0
+        while games < 3:
+            data = reader.read()
+            assert data is not None
+            games += type(data) is GameData.ServerGameOver
@@ -0,0 +1,18 @@
+import session
+
+# Every seat plays the card it believes least playable: on seed 0 with 4 players,
+# the storm tokens end the game after 3 moves, before the last seat ever moved
+STORM_ORDER = [21, 22, 23, 9]
+
+
+def testGameOverBeforeEverySeatMoved(tmp_path, monkeypatch):
+    # The clients dump their results to outputs/ when the session closes
+    (tmp_path / "outputs").mkdir()
+    monkeypatch.chdir(tmp_path)
+    game_session = session.SocketSession(num_players=4, subscribe=False)
+    try:
+        assert game_session.play(STORM_ORDER, seed=0) == 0
+        # The clients are still there for the next game
+        assert game_session.play(STORM_ORDER, seed=1) >= 0
+    finally:
+        game_session.close()
@@ -0,0 +1,81 @@
+import pytest
+import GameData
+import utils
+from random import Random
+from game import DECK, Game, NUM_VALUES
+from testhelpers import comparable
+
+NAMES = ["alice", "bob", "carol", "dave", "erin"]
+SEEDS = range(10)
+PLAYER_COUNTS = [2, 3, 4, 5]
+LOOKAHEAD = 4  # random moves played from every snapshot before restoring it
+
+
+def startGame(seed, num_players):
+    game = Game(seed=seed)
+    for name in NAMES[:num_players]:
+        game.addPlayer(name)
+    game.start()
+    return game
+
+
+def randomRequest(rng, game, names):
+    """a random move of the current player, playing mostly playable cards so that games last: (request, sender)"""
+    state, _ = game.satisfyRequest(GameData.ClientGetGameStateRequest(names[0]), names[0])
+    sender = state.currentPlayer
+    _, _, stacks, hands = game.snapshot()[:4]
+    hand = hands[names.index(sender)]
+    codes = [DECK[card] for card in hand]
+    playable = [i for i, code in enumerate(codes) if len(stacks[code // NUM_VALUES]) == code % NUM_VALUES]
+    if rng.random() < 0.03:
+        return GameData.ClientPlayerPlayCardRequest(sender, rng.randrange(len(hand))), sender
+    # The tokens are checked as clients do, the game logs the moves they forbid
+    kinds = ["play"] * (len(playable) > 0) + ["discard"] * (state.usedNoteTokens > 0) + ["hint"] * (state.usedNoteTokens < 8)
+    kind = rng.choice(kinds)
+    if kind == "play":
+        return GameData.ClientPlayerPlayCardRequest(sender, rng.choice(playable)), sender
+    if kind == "discard":
+        return GameData.ClientPlayerDiscardCardRequest(sender, rng.randrange(len(hand))), sender
+    destination = rng.choice([name for name in names if name != sender])
+    if rng.random() < 0.5:
+        return GameData.ClientHintData(sender, destination, "color", rng.choice(utils.COLORS)), sender
+    return GameData.ClientHintData(sender, destination, "value", rng.randint(1, 5)), sender
+
+
+def playRandomGame(game, seed, lookahead):
+    """
+    plays a started game with random moves and returns its answers, score and final state.
+    With lookahead, a few other random moves are tried from a snapshot before every move, and undone
+    """
+    names = [player.name for player in game.getPlayers()]
+    rng = Random(seed)
+    lookahead_rng = Random(-seed - 1)
+    answers = []
+    while not game.isGameOver():
+        if lookahead:
+            before = game.snapshot()
+            for _ in range(LOOKAHEAD):
+                if game.isGameOver():
+                    break
+                game.satisfyRequest(*randomRequest(lookahead_rng, game, names))
+            game.restore(before)
+            assert game.snapshot() == before
+        answers.append(comparable(list(game.satisfyRequest(*randomRequest(rng, game, names)))))
+    return answers, game.getScore(), game.snapshot()
+
+
+@pytest.mark.parametrize("num_players", PLAYER_COUNTS)
+@pytest.mark.parametrize("seed", SEEDS)
+def testSearchedGamePlaysAsStraightGame(seed, num_players):
+    straight = playRandomGame(startGame(seed, num_players), seed, lookahead=False)
+    assert playRandomGame(startGame(seed, num_players), seed, lookahead=True) == straight
+
+
+@pytest.mark.parametrize("num_players", PLAYER_COUNTS)
+def testRestoreAfterGameOver(num_players):
+    game = startGame(0, num_players)
+    start = game.snapshot()
+    first = playRandomGame(game, 0, lookahead=False)
+    game.restore(start)
+    assert game.snapshot() == start
+    assert playRandomGame(game, 0, lookahead=False) == first
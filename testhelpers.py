@@ -0,0 +1,17 @@
+import GameData
+from game import Card, Player
+
+
+def comparable(value):
+    """plain data standing for a message field, for objects that do not define equality"""
+    if isinstance(value, GameData.GameData):
+        return (type(value), comparable(vars(value)))
+    if isinstance(value, Player):
+        return ("Player", value.name, value.ready, comparable(value.hand))
+    if isinstance(value, Card):
+        return ("Card", value.id, value.value, value.color)
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    return value
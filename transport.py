@@ -0,0 +1,145 @@
+import asyncio
+import os
+import socket
+import tempfile
+from constants import HOST, PORT
+
+# Transports between server and clients, chosen by the scheme of the server address:
+# tcp://host:port   TCP socket, port 0 lets the system choose a free one
+# unix://path       Unix domain socket, with no path a new one in a temporary directory
+# socketpair        sockets connected in pairs before the server and the clients start, one pair per seat
+TCP = "tcp"
+UNIX = "unix"
+SOCKETPAIR = "socketpair"
+
+DEFAULT_ADDRESS = f"{TCP}://{HOST}:{PORT}"
+# Connections waiting to be accepted: a runner may connect hundreds of seats at once (see botrunner.py)
+BACKLOG = 1024
+
+# Socket pairs made in this process and not released yet, see closeInherited
+pairSockets = []
+# Tasks serving the socket pairs: asyncio only keeps weak references to them and their streams,
+# unlike the tasks of the connections accepted by a server
+pairTasks = set()
+# Unix sockets serve made in new temporary directories, see removeTemporarySockets
+temporarySockets = []
+
+
+def parseAddress(address):
+    """
+    splits an address into its transport and location: (host, port) for TCP, a path for Unix sockets,
+    the connected socket itself for a socketpair end. A (host, port) pair is TCP, a path without scheme a Unix socket
+    """
+    if isinstance(address, socket.socket):
+        return SOCKETPAIR, address
+    if isinstance(address, tuple):
+        return TCP, address
+    if address == SOCKETPAIR:
+        return SOCKETPAIR, None
+    if "://" not in address:
+        return UNIX, address
+    scheme, location = address.split("://", 1)
+    if scheme == TCP:
+        host, port = location.rsplit(":", 1)
+        return TCP, (host, int(port))
+    if scheme == UNIX:
+        return UNIX, location
+    raise ValueError(f"Unknown transport: {scheme}")
+
+
+def formatAddress(scheme, location):
+    if scheme == TCP:
+        return f"{TCP}://{location[0]}:{location[1]}"
+    if scheme == UNIX:
+        return f"{UNIX}://{location}"
+    return SOCKETPAIR
+
+
+def connect(address):
+    """returns a socket connected to the server at the address"""
+    scheme, location = parseAddress(address)
+    if scheme == SOCKETPAIR:
+        # Sockets of the other seats inherited from the launcher would keep their seats connected
+        closeInherited([location])
+        return location
+    family = socket.AF_INET if scheme == TCP else socket.AF_UNIX
+    _socket = socket.socket(family, socket.SOCK_STREAM)
+    _socket.connect(location)
+    return _socket
+
+
+async def openConnection(address):
+    """asyncio counterpart of connect, returns the stream reader and writer of the connection"""
+    scheme, location = parseAddress(address)
+    if scheme == SOCKETPAIR:
+        return await asyncio.open_connection(sock=location)
+    if scheme == UNIX:
+        return await asyncio.open_unix_connection(location)
+    return await asyncio.open_connection(location[0], location[1])
+
+
+def socketPairs(count):
+    """makes [count] connected socket pairs, returns the server ends and the client ends"""
+    pairs = [socket.socketpair() for _ in range(count)]
+    for pair in pairs:
+        pairSockets.extend(pair)
+    return [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+
+
+def release(sockets):
+    """closes the sockets handed to another process, the addresses of other transports are left as they are"""
+    for _socket in sockets:
+        if isinstance(_socket, socket.socket):
+            _socket.close()
+            if _socket in pairSockets:
+                pairSockets.remove(_socket)
+
+
+def closeInherited(kept):
+    """
+    closes the socket pair ends a forked process got from its launcher but does not use:
+    a connection only ends once every copy of the other end is closed
+    """
+    for _socket in pairSockets:
+        if _socket not in kept:
+            _socket.close()
+    pairSockets.clear()
+
+
+async def serve(address, handler, sockets=None):
+    """
+    serves the handler on the address, or on the server ends of socket pairs.
+    returns the asyncio server (None for socket pairs) and the address clients can reach it at
+    """
+    scheme, location = parseAddress(address)
+    if scheme == SOCKETPAIR:
+        closeInherited(sockets)
+        for _socket in sockets:
+            reader, writer = await asyncio.open_connection(sock=_socket)
+            task = asyncio.ensure_future(handler(reader, writer))
+            pairTasks.add(task)
+            task.add_done_callback(pairTasks.discard)
+        return None, SOCKETPAIR
+    if scheme == UNIX:
+        if location == "":
+            location = os.path.join(tempfile.mkdtemp(), "hanabi.sock")
+            temporarySockets.append(location)
+        server = await asyncio.start_unix_server(handler, location, backlog=BACKLOG)
+    else:
+        server = await asyncio.start_server(handler, location[0], location[1], reuse_address=True, backlog=BACKLOG)
+    # The actual address: the port the system chose if asked for port 0
+    return server, formatAddress(scheme, server.sockets[0].getsockname())
+
+
+def removeTemporarySockets():
+    """removes the Unix sockets serve made with no path given, and their temporary directories"""
+    for path in temporarySockets:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+    temporarySockets.clear()
@@ -1,129 +1,102 @@
-from unittest import result
-from game import Card
-from copy import deepcopy
+from game import COLORS, COLOR_INDEX, COPIES, cardCode
 import numpy as np
 
 
-def generateDeck():
-    colors = ["red", "blue", "green", "yellow", "white"]
-    values = [(1, 3), (2, 2), (3, 2), (4, 2), (5, 1)]
-    deck = {}
-    n = 0
+VALUES = [1, 2, 3, 4, 5]
 
-    for color in colors:
-        deck[color] = []
-        for pair in values:
-            value, count = pair[0], pair[1]
-            for _ in range(0, count):
-                deck[color].append(Card(id=n, color=color, value=value))
-                n += 1
 
-    return deck
+def cardIndex(color, value):
+    """position of a (color, value) pair in a 25 entries card count vector: its card code in the engine"""
+    return cardCode(color, value)
 
 
-def isCardKnown(card_info_dict):
-    return (card_info_dict["color"] is not None) and (card_info_dict["value"]
-                                                      is not None)
-
-
-def isCardUnidentified(card_info_dict):
-    return (card_info_dict["color"] is None) & (card_info_dict["value"] is
-                                                None)
-
+def generateCardCounts():
+    """count vector of the whole deck: how many copies of every (color, value) pair exist"""
+    return [COPIES[value - 1] for _ in COLORS for value in VALUES]
 
-def isCardPlayable(card_info_dict, table):
-    if not isCardKnown(card_info_dict):
-        return False
-
-    color = card_info_dict["color"]
-    value = card_info_dict["value"]
-    still_no_cards = len(table[color]) == 0
 
-    if still_no_cards:
-        return value == 1
+# Beliefs: the cards a hand slot may hold as a 25 bits mask, bit i standing for card code i (see game.cardCode)
+FULL_BELIEF = (1 << 25) - 1
+COLOR_BITS = {color: sum(1 << cardCode(color, value) for value in VALUES) for color in COLORS}
+VALUE_BITS = {value: sum(1 << cardCode(color, value) for color in COLORS) for value in VALUES}
+BELIEF_BITS = 1 << np.arange(25)
 
-    highest_stack_card = max((table[color]),
-                             key=(lambda c: c.value),
-                             default=None)
-    if highest_stack_card is None:
-        return False
 
-    return (value - 1) == highest_stack_card.value
+def hintBits(hint_type, value):
+    """belief bits of the cards matching a hint"""
+    if hint_type == "value":
+        return VALUE_BITS[value]
+    return COLOR_BITS[value]
 
 
-def subtractCardsFrom(my_cards, cards_to_subtract):
-    result_cards = deepcopy(my_cards)
+def beliefColor(belief):
+    """the color of a slot if its belief leaves only one, None otherwise"""
+    colors = [color for color in COLORS if belief & COLOR_BITS[color]]
+    return colors[0] if len(colors) == 1 else None
 
-    if (len(cards_to_subtract) == 0) or (len(my_cards) == 0):
-        return result_cards
 
-    for color in my_cards.keys():
-        if not (color in cards_to_subtract.keys()):
-            continue
-        for card_to_subtract in cards_to_subtract[color]:
-            for i, my_card in enumerate(my_cards[color]):
-                if result_cards[color][i] is None:
-                    continue
-                if (my_card.value == card_to_subtract.value) & (
-                        my_card.color == card_to_subtract.color):
-                    result_cards[color][i] = None
-                    break
+def beliefValue(belief):
+    """the value of a slot if its belief leaves only one, None otherwise"""
+    values = [value for value in VALUES if belief & VALUE_BITS[value]]
+    return values[0] if len(values) == 1 else None
 
-        result_cards[color] = list(
-            filter(lambda c: c is not None, result_cards[color]))
 
-    return result_cards
+def beliefMasks(beliefs):
+    """(slots x 25) masks of the cards each hand slot may hold, from the beliefs of the slots"""
+    return (np.asarray(beliefs)[:, None] & BELIEF_BITS) != 0
 
 
-def getOtherPlayersCards(client):
-    result_cards = {}
-
-    for player in client.game_data["players"]:
-        if player.name == client.player_name:
-            continue
-        hand = deepcopy(player.hand)
-        for card in hand:
-            if not (card.color in result_cards.keys()):
-                result_cards[card.color] = []
-            result_cards[card.color].append(card)
-
-    return result_cards
+def isCardKnown(card_info_dict):
+    return (card_info_dict["color"] is not None) and (card_info_dict["value"]
+                                                      is not None)
 
 
-def getDiscardedCards(discard_pile):
-    result_cards = {}
+def isCardUnidentified(card_info_dict):
+    return (card_info_dict["color"] is None) & (card_info_dict["value"] is
+                                                None)
 
-    for card in discard_pile:
-        if not (card.color in result_cards.keys()):
-            result_cards[card.color] = []
-        result_cards[card.color].append(card)
 
-    return result_cards
+def getScoreFromClients(clients):
+    """computes the final score of a game from the table cards seen by its players"""
+    # I ignore that server counts as zero-points games the ones that end with storm
+    # tokens. I count the points up until that point
+    score = 0
+    for client in clients:
+        temp_score = 0
+        # A client that never got a table (no game start) has seen nothing on it
+        table_cards = client.game_data.get("tableCards", {})
 
+        for card_stack in table_cards:
+            temp_score += len(table_cards[card_stack])
 
-def calculatePlayability(hint, possible_cards, table_cards):
-    cards = list({x for v in possible_cards.values() for x in v})
+        # Sometimes player get different scores for some reason -> probably it has an outdated table
+        if temp_score > score:
+            score = temp_score
 
-    if hint["color"] is not None:
-        cards = list(filter(lambda c: c.color == hint["color"], cards))
-    if hint["value"] is not None:
-        cards = list(filter(lambda c: c.value == hint["value"], cards))
+    return score
 
-    playable_cards = list(
-        filter(
-            lambda c: isCardPlayable(card_info_dict={
-                "color": c.color,
-                "value": c.value
-            },
-                                     table=table_cards),
-            cards,
-        ))
 
-    try:
-        p = len(playable_cards) / len(cards)
-        return p
-    except:
-        return 0
+def calculatePlayabilityVector(masks, unseen_cards, table_cards):
+    """
+    playability and discardability (1 - playability, as used by the discard rules) of all hand slots at once.
+    masks: (slots x 25) boolean array, the cards each slot may hold (see beliefMasks)
+    unseen_cards: count vector of the cards we cannot see
+    """
+    # the playable card of every color is the one above the stack top, none once the stack is complete
+    playable_cards = [
+        COLOR_INDEX[color] * len(VALUES) + len(table_cards[color])
+        for color in COLORS if len(table_cards[color]) < len(VALUES)
+    ]
+    unseen_cards = np.asarray(unseen_cards)
+    # one product gives both the possible and the playable cards of every slot
+    weights = np.zeros((25, 2), dtype=int)
+    weights[:, 0] = unseen_cards
+    weights[playable_cards, 1] = unseen_cards[playable_cards]
+    counts = masks @ weights
+
+    # a slot without possible cards has no playable ones either: its playability is 0
+    playability = counts[:, 1] / np.maximum(counts[:, 0], 1)
+    return playability, 1 - playability
 
 
 def saveSolutionToFile(solution, score):